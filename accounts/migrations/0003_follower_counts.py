@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 09:13
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counts(apps, schema_editor):
+    Follower = apps.get_model('accounts', 'Follower')
+    for field_name, counter in (('followers', 'num_followers'),
+                                ('following', 'num_following')):
+        counts = Follower.objects.annotate(total=Count(field_name)).filter(
+            total__gt=0).values_list('id', 'total')
+        for follower_id, total in counts:
+            Follower.objects.filter(id=follower_id).update(**{counter: total})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_myuser_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follower',
+            name='num_followers',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='follower',
+            name='num_following',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    # Only PostgreSQL has pg_trgm and expression indexes with opclasses;
+    # other databases use the in-process search backend.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Serves UPPER(full_name) LIKE UPPER('term%') from istartswith
+    schema_editor.execute(
+        'CREATE INDEX accounts_myuser_full_name_upper_like '
+        'ON accounts_myuser (UPPER(full_name) text_pattern_ops)')
+    # Serves the trigram % operator
+    schema_editor.execute(
+        'CREATE INDEX accounts_myuser_full_name_trgm '
+        'ON accounts_myuser USING gin (full_name gin_trgm_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS accounts_myuser_full_name_upper_like')
+    schema_editor.execute('DROP INDEX IF EXISTS accounts_myuser_full_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_follower_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -61,6 +61,25 @@ class MyUserManager(BaseUserManager):
                                  is_staff=True, is_superuser=True,
                                  **extra_fields)
 
+    def visible_to(self, viewer):
+        """
+        Returns the active users the viewer may find: users blocking or
+        blocked by the viewer are hidden, and so are private users the
+        viewer doesn't follow.
+        """
+        blocking = self.model.blocking.through.objects
+        followed = self.filter(
+            follower__followers__user_id=viewer.pk).values('pk')
+        return self.get_queryset().filter(is_active=True).exclude(
+            pk=viewer.pk).exclude(
+                pk__in=blocking.filter(
+                    from_myuser_id=viewer.pk).values('to_myuser_id')
+            ).exclude(
+                pk__in=blocking.filter(
+                    to_myuser_id=viewer.pk).values('from_myuser_id')
+            ).exclude(
+                models.Q(is_private=True) & ~models.Q(pk__in=followed))
+
 
 @python_2_unicode_compatible
 class MyUser(AbstractBaseUser, PermissionsMixin):
@@ -167,6 +186,9 @@ class Follower(TimeStampedModel):
     user = models.OneToOneField(MyUser, on_delete=models.CASCADE)
     followers = models.ManyToManyField('self', related_name='following',
                                        symmetrical=False)
+    # Maintained by accounts.signals.
+    num_followers = models.PositiveIntegerField(default=0)
+    num_following = models.PositiveIntegerField(default=0)
 
     class Meta:
         app_label = 'accounts'
@@ -175,27 +197,17 @@ class Follower(TimeStampedModel):
     def __str__(self):
         return str(self.user.full_name)
 
-    @cached_property
-    def get_followers_info(self):
-        return self.followers.select_related('user').values(
-            'user__id', 'user__full_name', 'user__profile_pic')
-
-    @cached_property
-    def get_following_info(self):
-        return self.following.select_related('user').values(
-            'user__id', 'user__full_name', 'user__profile_pic')
-
     def short_followers_count(self):
-        return readable_number(self.get_followers_info.count(), short=True)
+        return readable_number(self.num_followers, short=True)
 
     def short_following_count(self):
-        return readable_number(self.get_following_info.count(), short=True)
+        return readable_number(self.num_following, short=True)
 
     def followers_count(self):
-        return str(self.get_followers_info.count())
+        return str(self.num_followers)
 
     def following_count(self):
-        return str(self.get_following_info.count())
+        return str(self.num_following)
 
 
 MyUser.profile = property(lambda u: Follower.objects.get_or_create(user=u)[0])
@@ -0,0 +1,46 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed
+
+from .models import Follower
+
+
+def update_follow_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keeps Follower.num_followers and num_following in step with the
+    followers relation, from either side of it.
+    """
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+
+    # followed.followers.add(follower) is the forward side and
+    # follower.following.add(followed) the reverse one.
+    if reverse:
+        own_counter, other_counter = 'num_following', 'num_followers'
+        own_column, other_column = 'to_follower_id', 'from_follower_id'
+    else:
+        own_counter, other_counter = 'num_followers', 'num_following'
+        own_column, other_column = 'from_follower_id', 'to_follower_id'
+
+    if action == 'post_add':
+        other_ids = pk_set
+    else:
+        # remove() reports every pk it was given, so look up the rows
+        # that actually go away before they are deleted.
+        rows = sender.objects.filter(**{own_column: instance.pk})
+        if action == 'pre_remove':
+            rows = rows.filter(**{'{}__in'.format(other_column): pk_set})
+        other_ids = list(rows.values_list(other_column, flat=True))
+
+    if not other_ids:
+        return
+    delta = len(other_ids) if action == 'post_add' else -len(other_ids)
+    step = 1 if action == 'post_add' else -1
+
+    Follower.objects.filter(pk=instance.pk).update(
+        **{own_counter: F(own_counter) + delta})
+    setattr(instance, own_counter, getattr(instance, own_counter) + delta)
+    Follower.objects.filter(pk__in=other_ids).update(
+        **{other_counter: F(other_counter) + step})
+
+
+m2m_changed.connect(update_follow_counts, sender=Follower.followers.through)
@@ -1,3 +1,242 @@
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import Follower, MyUser
+from api.cache import get_stats
+
+
+def make_user(email, full_name='Test User', password='abc1234'):
+    return MyUser.objects.create_user(email=email, full_name=full_name,
+                                      password=password)
+
+
+class FollowCountTest(TestCase):
+    def setUp(self):
+        self.star = Follower.objects.create(user=make_user('star@test.com'))
+        self.fans = [Follower.objects.create(
+                         user=make_user('fan{}@test.com'.format(i)))
+                     for i in range(3)]
+
+    def assertCounts(self, follower, followers, following):
+        follower = Follower.objects.get(pk=follower.pk)
+        self.assertEqual(follower.num_followers, followers)
+        self.assertEqual(follower.num_following, following)
+
+    def test_follow_and_unfollow(self):
+        self.star.followers.add(*self.fans)
+        self.star.followers.add(self.fans[0])
+        self.assertCounts(self.star, 3, 0)
+        self.assertCounts(self.fans[0], 0, 1)
+        self.assertEqual(self.star.followers_count(), '3')
+
+        self.star.followers.remove(self.fans[0], self.fans[0])
+        self.assertCounts(self.star, 2, 0)
+        self.assertCounts(self.fans[0], 0, 0)
+
+    def test_reverse_side(self):
+        fan = self.fans[0]
+        fan.following.add(self.star, self.fans[1])
+        self.assertCounts(fan, 0, 2)
+        self.assertCounts(self.star, 1, 0)
+
+        fan.following.clear()
+        self.assertCounts(fan, 0, 0)
+        self.assertCounts(self.star, 0, 0)
+
+
+class FollowAPITest(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer@test.com')
+        self.star = make_user('star@test.com')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+        cache.clear()
+
+    def test_follow_status_api_updates_counts(self):
+        response = self.client.post(
+            reverse('follow_status_api', kwargs={'user_pk': self.star.pk}))
+        self.assertEqual(response.data['followers_count'], '1')
+        self.assertEqual(
+            Follower.objects.get(user=self.viewer).num_following, 1)
+
+        response = self.client.get(
+            reverse('user_followers_list_api',
+                    kwargs={'user_pk': self.star.pk}))
+        self.assertEqual([user['id'] for user in response.data['results']],
+                         [self.viewer.pk])
+        response = self.client.get(
+            reverse('user_following_list_api',
+                    kwargs={'user_pk': self.viewer.pk}))
+        self.assertEqual([user['id'] for user in response.data['results']],
+                         [self.star.pk])
+
+        response = self.client.post(
+            reverse('follow_status_api', kwargs={'user_pk': self.star.pk}))
+        self.assertEqual(response.data['followers_count'], '0')
+
+    def test_block_user_api_updates_counts(self):
+        Follower.objects.create(user=self.star).followers.add(
+            Follower.objects.create(user=self.viewer))
+        self.viewer.follower.followers.add(self.star.follower)
+
+        response = self.client.post(
+            reverse('block_user_api', kwargs={'user_pk': self.star.pk}))
+        self.assertEqual(response.data['followers_count'], '0')
+        self.assertEqual(response.data['following_count'], '0')
+        viewer = Follower.objects.get(user=self.viewer)
+        self.assertEqual((viewer.num_followers, viewer.num_following), (0, 0))
+
+
+class FollowListAPITest(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer@test.com')
+        self.star = make_user('star@test.com')
+        self.fan = make_user('fan@test.com')
+        Follower.objects.create(user=self.star).followers.add(
+            Follower.objects.create(user=self.fan))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+        cache.clear()
+
+    def get(self, name, user):
+        return self.client.get(reverse(name, kwargs={'user_pk': user.pk}))
+
+    def test_lists_follows(self):
+        response = self.get('user_followers_list_api', self.star)
+        self.assertEqual([user['id'] for user in response.data['results']],
+                         [self.fan.pk])
+        response = self.get('user_following_list_api', self.fan)
+        self.assertEqual([user['id'] for user in response.data['results']],
+                         [self.star.pk])
+
+    def test_hidden_from_blocked_users(self):
+        self.star.blocking.add(self.viewer)
+        self.fan.blocking.add(self.viewer)
+        response = self.get('user_followers_list_api', self.star)
+        self.assertEqual(response.status_code, 403)
+        response = self.get('user_following_list_api', self.fan)
+        self.assertEqual(response.status_code, 403)
+
+
+class SearchCacheTest(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice@test.com', full_name='Alice')
+        self.bob = make_user('bob@test.com', full_name='Bob')
+        self.client = APIClient()
+        cache.clear()
+
+    def search(self, user, q):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('search_api'), {'q': q})
+        return [result['id'] for result in response.data]
+
+    def test_responses_are_cached_per_user(self):
+        self.assertEqual(self.search(self.alice, 'B'), [self.bob.pk])
+        # Bob never sees himself, even though Alice's search is cached
+        self.assertEqual(self.search(self.bob, 'B'), [])
+        self.assertEqual(self.search(self.bob, 'A'), [self.alice.pk])
+
+    def test_repeated_request_hits_cache(self):
+        self.search(self.alice, 'B')
+        # update() sends no signals, so nothing is invalidated
+        MyUser.objects.filter(pk=self.bob.pk).update(full_name='Carl')
+        self.assertEqual(self.search(self.alice, 'B'), [self.bob.pk])
+        self.assertEqual(self.search(self.alice, 'Bo'), [])
+
+    def test_new_users_are_found(self):
+        self.search(self.alice, 'B')
+        bea = make_user('bea@test.com', full_name='Bea')
+        self.assertEqual(sorted(self.search(self.alice, 'B')),
+                         sorted([self.bob.pk, bea.pk]))
+
+    def test_empty_term_finds_nobody(self):
+        self.assertEqual(self.search(self.alice, ''), [])
+
+
+class ProfileCacheTest(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer@test.com')
+        self.star = make_user('star@test.com')
+        Follower.objects.create(user=self.star)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+        self.url = reverse('user_account_detail_api',
+                           kwargs={'user_pk': self.star.pk})
+        cache.clear()
+
+    def test_writes_invalidate_cached_profile(self):
+        self.assertTrue(self.client.get(self.url).data['viewer_can_see'])
+        self.client.get(self.url)
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 1})
+
+        self.client.post(reverse('privacy_status_api',
+                                 kwargs={'user_pk': self.star.pk}))
+        self.assertFalse(self.client.get(self.url).data['viewer_can_see'])
+
+        self.client.post(reverse('follow_status_api',
+                                 kwargs={'user_pk': self.star.pk}))
+        data = self.client.get(self.url).data
+        self.assertTrue(data['viewer_can_see'])
+        self.assertEqual(data['follower']['followers_count'], '1')
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 3})
+
+    def test_bookkeeping_saves_keep_cache(self):
+        self.client.get(self.url)
+        self.star.last_login = datetime.now()
+        self.star.save(update_fields=['last_login'])
+        self.client.get(self.url)
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 1})
+
+        self.star.bio = 'Hello'
+        self.star.save(update_fields=['bio'])
+        self.assertEqual(self.client.get(self.url).data['bio'], 'Hello')
+
+    def test_new_users_invalidate_user_list(self):
+        url = reverse('user_account_list_api')
+        self.assertEqual(len(self.client.get(url).data['results']), 2)
+        make_user('new@test.com')
+        self.assertEqual(len(self.client.get(url).data['results']), 3)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer@test.com', full_name='Viewer')
+        Follower.objects.create(user=self.viewer)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+        cache.clear()
+
+    def search(self, q):
+        response = self.client.get(reverse('search_api'), {'q': q})
+        return [result['full_name'] for result in response.data]
+
+    def test_prefix_matches_rank_before_similar_names(self):
+        make_user('jon@test.com', full_name='Jonathon')
+        make_user('jonas@test.com', full_name='jonas')
+        make_user('jane@test.com', full_name='Jane')
+        # Closest first among the names starting with the term
+        self.assertEqual(self.search('JONA'), ['jonas', 'Jonathon'])
+        # Typos still find similar names, the closest first
+        self.assertEqual(self.search('Jonathan'), ['Jonathon', 'jonas'])
+
+    def test_hidden_users(self):
+        blocker = make_user('blocker@test.com', full_name='Sam Blocker')
+        blocked = make_user('blocked@test.com', full_name='Sam Blocked')
+        private = MyUser.objects.create_user(
+            'private@test.com', 'Sam Private', is_private=True)
+        followed = MyUser.objects.create_user(
+            'followed@test.com', 'Sam Followed', is_private=True)
+        MyUser.objects.filter(pk=make_user(
+            'inactive@test.com', full_name='Sam Inactive').pk).update(
+                is_active=False)
+        blocker.blocking.add(self.viewer)
+        self.viewer.blocking.add(blocked)
+        Follower.objects.create(user=private)
+        Follower.objects.create(user=followed).followers.add(
+            self.viewer.follower)
 
-# Create your tests here.
+        self.assertEqual(self.search('Sam'), ['Sam Followed'])
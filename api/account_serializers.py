@@ -14,10 +14,36 @@ class FollowerCreateSerializer(serializers.ModelSerializer):
 
 
 class FollowerSerializer(serializers.HyperlinkedModelSerializer):
+    followers_url = serializers.SerializerMethodField()
+    following_url = serializers.SerializerMethodField()
+
     class Meta:
         model = Follower
-        fields = ('followers_count', 'following_count',
-                  'get_followers_info', 'get_following_info',)
+        fields = ('followers_count', 'following_count', 'followers_url',
+                  'following_url',)
+
+    def get_followers_url(self, obj):
+        return api_reverse('user_followers_list_api',
+                           kwargs={'user_pk': obj.user_id},
+                           request=self.context['request'])
+
+    def get_following_url(self, obj):
+        return api_reverse('user_following_list_api',
+                           kwargs={'user_pk': obj.user_id},
+                           request=self.context['request'])
+
+
+class FollowUserSerializer(serializers.HyperlinkedModelSerializer):
+    account_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MyUser
+        fields = ('id', 'account_url', 'full_name', 'profile_pic',)
+
+    def get_account_url(self, obj):
+        return api_reverse('user_account_detail_api',
+                           kwargs={'user_pk': obj.pk},
+                           request=self.context['request'])
 
 
 class PhotoCreateSerializer(serializers.ModelSerializer):
@@ -81,14 +107,25 @@ class MyUserSerializer(serializers.HyperlinkedModelSerializer):
         return dict(MyUser.GENDER_CHOICES)[obj.gender]
 
     def get_event_count(self, obj):
-        request = self.context['request']
-        count = Party.objects.own_parties_hosting(user=obj, viewing_user=request.user).count()
-        return '0' if count == 0 else str(count)
+        return str(len(self._get_hosted_parties(obj)))
 
     def get_event_images(self, obj):
-        request = self.context['request']
-        return Party.objects.own_parties_hosting(user=obj, viewing_user=request.user).values(
-            'id', 'image')
+        return self._get_hosted_parties(obj)
+
+    def _get_hosted_parties(self, obj):
+        """
+        Returns the id and image of the parties obj is hosting that the
+        viewer may see, querying once per serialized user.
+        """
+        if not hasattr(self, '_hosted_parties'):
+            self._hosted_parties = {}
+        if obj.pk not in self._hosted_parties:
+            request = self.context['request']
+            self._hosted_parties[obj.pk] = list(
+                Party.objects.own_parties_hosting(
+                    user=obj, viewing_user=request.user).values(
+                        'id', 'image'))
+        return self._hosted_parties[obj.pk]
 
     def get_photos(self, obj):
         queryset = Photo.objects.filter(user=obj)
@@ -98,6 +135,7 @@ class MyUserSerializer(serializers.HyperlinkedModelSerializer):
 
     def get_viewer_can_see(self, obj):
         viewing_user = self.context['request'].user
-        if obj.is_private and viewing_user not in obj.follower.followers.all():
+        if obj.is_private and not obj.follower.followers.filter(
+                user=viewing_user).exists():
             return False
         return True
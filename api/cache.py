@@ -0,0 +1,84 @@
+"""
+Version keys for cached API responses.
+
+Cached responses are tagged, e.g. with 'user:1' or 'party:2', and the
+current version of each tag is part of the cache key. Bumping a tag's
+version makes every response cached under the old one unreachable, so
+views can keep long timeouts without serving stale data.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+API_CACHE_ALIAS = getattr(settings, 'API_CACHE_ALIAS', 'default')
+
+STATS_KEYS = {True: 'api:stats:hits', False: 'api:stats:misses'}
+
+
+def _version_key(tag):
+    return 'api:version:%s' % tag
+
+
+def _new_version():
+    # A version that was never handed out before, even if the old one was
+    # evicted from the cache.
+    return int(time.time() * 1000)
+
+
+def user_tag(user_id):
+    return 'user:%s' % user_id
+
+
+def party_tag(party_id):
+    return 'party:%s' % party_id
+
+
+def get_versions(tags):
+    """
+    Returns the current version of each tag, in order, starting new
+    versions for tags without one.
+    """
+    cache = caches[API_CACHE_ALIAS]
+    keys = [_version_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = _new_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def bump(*tags):
+    """
+    Moves the given tags to a new version, invalidating the responses
+    cached under them.
+    """
+    cache = caches[API_CACHE_ALIAS]
+    for tag in set(tags):
+        try:
+            cache.incr(_version_key(tag))
+        except ValueError:
+            cache.set(_version_key(tag), _new_version(), None)
+
+
+def record(hit):
+    """Counts a cache hit or miss."""
+    cache = caches[API_CACHE_ALIAS]
+    try:
+        cache.incr(STATS_KEYS[hit])
+    except ValueError:
+        cache.set(STATS_KEYS[hit], 1, None)
+
+
+def get_stats():
+    """Returns the number of cache hits and misses counted so far."""
+    counts = caches[API_CACHE_ALIAS].get_many(STATS_KEYS.values())
+    return {
+        'hits': counts.get(STATS_KEYS[True], 0),
+        'misses': counts.get(STATS_KEYS[False], 0),
+    }
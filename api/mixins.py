@@ -1,6 +1,14 @@
+import hashlib
+
+from django.core.cache import caches
+from django.utils.encoding import force_bytes
+from django.utils.six.moves.urllib.parse import urlencode
 from rest_framework import authentication, filters, permissions
+from rest_framework.response import Response
 from rest_framework_jwt.authentication import JSONWebTokenAuthentication
 
+from .cache import API_CACHE_ALIAS, get_versions, record
+
 
 class DefaultsMixin(object):
     """
@@ -24,3 +32,48 @@ class FiltersMixin(object):
         filters.SearchFilter,
         filters.OrderingFilter,
     )
+
+
+class CacheMixin(object):
+    """
+    Caches the data of successful GET responses for cache_timeout seconds.
+    Entries are keyed by view, URL kwargs, query params and authenticated
+    user, so one user's response is never served to another, and by the
+    versions of the view's cache tags, so bumping a tag invalidates them.
+    """
+    cache_timeout = 60
+    cache_tags = ()
+
+    def get_cache_timeout(self):
+        return self.cache_timeout
+
+    def get_cache_tags(self):
+        return self.cache_tags
+
+    def get_cache_key(self, request):
+        user = request.user
+        user_id = user.pk if user.is_authenticated() else 'anonymous'
+        params = urlencode(sorted(
+            (key, value) for key, values in request.query_params.lists()
+            for value in values))
+        kwargs = urlencode(sorted(self.kwargs.items()))
+        tags = self.get_cache_tags()
+        versions = ','.join('%s=%s' % pair
+                            for pair in zip(tags, get_versions(tags)))
+        digest = hashlib.md5(force_bytes('%s?%s#%s' % (kwargs, params,
+                                                       versions)))
+        return 'api:%s:%s:%s' % (self.__class__.__name__, user_id,
+                                 digest.hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        cache = caches[API_CACHE_ALIAS]
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        record(data is not None)
+        if data is not None:
+            return Response(data)
+
+        response = super(CacheMixin, self).get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.get_cache_timeout())
+        return response
@@ -20,7 +20,7 @@ class NotificationSerializer(serializers.HyperlinkedModelSerializer):
 
     def get_recipient_url(self, obj):
         return api_reverse('user_account_detail_api',
-                           kwargs={'user_pk': obj.recipient.pk},
+                           kwargs={'user_pk': obj.recipient_id},
                            request=self.context['request'])
 
     def get_sender_url(self, obj):
@@ -1,9 +1,160 @@
-from rest_framework.pagination import LimitOffsetPagination
+import base64
+import datetime
+import json
+from collections import OrderedDict
 
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, LimitOffsetPagination,
+                                       _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class AccountPagination(LimitOffsetPagination):
-    default_limit = 15
-    max_limit = 15
+
+def _cursor_value(value):
+    # Unlike DjangoJSONEncoder, keeps the microseconds of datetimes so
+    # that the position matches the row exactly.
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates by the values of the ordering columns of the last row seen
+    instead of an offset, so every page costs the same however deep it
+    is. ordering must end with a unique column, e.g. ('-created', '-id').
+
+    Cursors are opaque to clients. The total count costs an extra query,
+    so it is only included when requested with ?count=true.
+    """
+    ordering = ('id',)
+    page_size = 30
+    max_page_size = 50
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self._invert(field) for field in ordering]
+        page = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                page = page.filter(self.get_keyset_filter(ordering, position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        page = list(page[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = queryset.count()
+
+        # Going backwards, the page we came from follows this one
+        has_next = reverse or has_more
+        has_previous = has_more if reverse else position is not None
+        self.next_position = self.previous_position = None
+        if page and has_next:
+            self.next_position = self.get_position(page[-1])
+        if page and has_previous:
+            self.previous_position = self.get_position(page[0])
+        return page
+
+    def get_paginated_response(self, data):
+        fields = [
+            ('next', self.get_link(self.next_position, reverse=False)),
+            ('previous', self.get_link(self.previous_position, reverse=True)),
+            ('results', data),
+        ]
+        if self.count is not None:
+            fields.insert(0, ('count', self.count))
+        return Response(OrderedDict(fields))
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_position(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def get_keyset_filter(self, ordering, position):
+        """
+        Returns the filter for the rows after position in the given
+        ordering: (a, b) > (x, y) becomes a >= x AND (a > x OR (a = x AND
+        b > y)). The leading a >= x lets the database range scan an index
+        on (a, b), which it can't do for the OR alone.
+        """
+        keyset = Q()
+        for index, field in reversed(list(enumerate(ordering))):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            after = Q(**{'{}__{}'.format(name, lookup): position[index]})
+            if index == len(ordering) - 1:
+                keyset = after
+            else:
+                keyset = after | (Q(**{name: position[index]}) & keyset)
+        first = ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{'{}__{}'.format(first.lstrip('-'), lookup):
+                    position[0]}) & keyset
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            reverse, position = json.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii'))
+                .decode('utf-8'))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(reverse)
+
+    def encode_cursor(self, position, reverse):
+        cursor = json.dumps([int(reverse), position], default=_cursor_value)
+        return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+
+    def get_link(self, position, reverse):
+        if position is None:
+            return None
+        # Only the first page pays for the count
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.count_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(position, reverse))
+
+    def _invert(self, field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+
+class AccountCursorPagination(KeysetPagination):
+    ordering = ('id',)
+    page_size = 15
+    max_page_size = 15
+
+
+class FollowPagination(LimitOffsetPagination):
+    default_limit = 30
+    max_limit = 50
     limit_query_param = "limit"
     offset_query_param = "offset"
 
@@ -15,8 +166,20 @@ class NotificationPagination(LimitOffsetPagination):
     offset_query_param = "offset"
 
 
+class NotificationCursorPagination(KeysetPagination):
+    ordering = ('-created', '-id')
+    page_size = 50
+    max_page_size = 50
+
+
 class PartyPagination(LimitOffsetPagination):
     default_limit = 30
     max_limit = 50
     limit_query_param = "limit"
     offset_query_param = "offset"
+
+
+class PartyCursorPagination(KeysetPagination):
+    ordering = ('starts_at', 'id')
+    page_size = 30
+    max_page_size = 50
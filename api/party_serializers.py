@@ -1,10 +1,45 @@
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_bytes
 from rest_framework import serializers
 from rest_framework.reverse import reverse as api_reverse
 
 from parties.models import Party
 
+from .cache import API_CACHE_ALIAS, get_versions, user_tag
+
+
+PARTY_CACHE_TIMEOUT = getattr(settings, 'PARTY_CACHE_TIMEOUT', 60 * 10)
+
+# Relations whose users' names and pictures are part of the representation
+USER_RELATIONS = ('attendees', 'requesters', 'invited_users', 'likers')
+
+
+class PartyListSerializer(serializers.ListSerializer):
+    """
+    Fetches the cached representation of every party on the page with a
+    single get_many.
+    """
+    def to_representation(self, data):
+        parties = list(data.all() if isinstance(data, models.Manager)
+                       else data)
+        cached = self.child.get_cached_representations(parties)
+        return [self.child.render(party, cached[party.pk])
+                for party in parties]
+
 
 class PartySerializer(serializers.HyperlinkedModelSerializer):
+    """
+    The representation is the same for every viewer, so it is cached per
+    party. It is keyed by the party's modified time and by the cache
+    versions of the host and guests, whose profile edits don't touch the
+    party.
+    """
     party_url = serializers.SerializerMethodField()
     user_url = serializers.SerializerMethodField()
     user = serializers.CharField(source='user.full_name', read_only=True)
@@ -23,9 +58,83 @@ class PartySerializer(serializers.HyperlinkedModelSerializer):
                   'location', 'latitude', 'longitude', 'party_size',
                   'party_month', 'party_day', 'party_year', 'recurrence',
                   'start_time', 'end_time', 'description', 'image',
-                  'attendees_count', 'requesters_count', 'get_attendees_info',
+                  'attendees_count', 'requesters_count',
+                  'invited_users_count', 'likers_count', 'get_attendees_info',
                   'get_requesters_info', 'get_invited_users_info',
                   'get_likers_info',)
+        list_serializer_class = PartyListSerializer
+
+    def to_representation(self, instance):
+        cached = self.get_cached_representations([instance])
+        return self.render(instance, cached[instance.pk])
+
+    def get_cache_key(self, obj, user_versions):
+        # URLs in the representation are absolute, so they depend on the
+        # host the request was made to.
+        digest = hashlib.md5(force_bytes('%s#%s' % (
+            self.context['request'].build_absolute_uri('/'),
+            ','.join('%s=%s' % pair for pair in user_versions))))
+        return 'api:party:%s:%s:%s' % (obj.pk, obj.modified.isoformat(),
+                                       digest.hexdigest())
+
+    def get_user_ids(self, parties):
+        """
+        Returns a dict mapping the id of each party to the ids of its host
+        and guests, with one query per relation.
+        """
+        user_ids = defaultdict(set)
+        for party in parties:
+            user_ids[party.pk].add(party.user_id)
+        party_ids = list(user_ids)
+        for field_name in USER_RELATIONS:
+            field = Party._meta.get_field(field_name)
+            party_column = '{}_id'.format(field.m2m_field_name())
+            user_column = '{}_id'.format(field.m2m_reverse_field_name())
+            rows = field.remote_field.through.objects.filter(
+                **{'{}__in'.format(party_column): party_ids}
+            ).values_list(party_column, user_column)
+            for party_id, user_id in rows:
+                user_ids[party_id].add(user_id)
+        return user_ids
+
+    def get_cached_representations(self, parties):
+        """
+        Returns a dict mapping the id of each party to its cached
+        representation, serializing and caching the ones that are missing.
+        """
+        cache = caches[API_CACHE_ALIAS]
+        user_ids = self.get_user_ids(parties)
+        all_user_ids = sorted(set().union(*user_ids.values()))
+        versions = dict(zip(all_user_ids, get_versions(
+            [user_tag(user_id) for user_id in all_user_ids])))
+        keys = dict(
+            (party.pk, self.get_cache_key(party, [
+                (user_id, versions[user_id])
+                for user_id in sorted(user_ids[party.pk])]))
+            for party in parties)
+        cached = cache.get_many(keys.values())
+        missing = {}
+        representations = {}
+        for party in parties:
+            key = keys[party.pk]
+            if key not in cached:
+                data = super(PartySerializer, self).to_representation(party)
+                for field_name, value in data.items():
+                    # The *_info fields are values() querysets
+                    if isinstance(value, QuerySet):
+                        data[field_name] = list(value)
+                cached[key] = missing[key] = data
+            representations[party.pk] = cached[key]
+        if missing:
+            cache.set_many(missing, PARTY_CACHE_TIMEOUT)
+        return representations
+
+    def render(self, obj, data):
+        # Views may mark parties that have ended as inactive without
+        # saving them, so is_active isn't taken from the cache.
+        data = data.copy()
+        data['is_active'] = obj.is_active
+        return data
 
     def get_party_url(self, obj):
         return api_reverse('party_detail_api',
@@ -0,0 +1,104 @@
+"""
+User search backends.
+
+PostgresSearchBackend runs in the database, using the indexes created by
+accounts/migrations/0004_myuser_search_indexes. The in-process backend
+ranks in Python and is used on other databases, e.g. SQLite in tests.
+SEARCH_BACKEND may name another backend class.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils.module_loading import import_string
+
+
+SEARCH_BACKEND = getattr(settings, 'SEARCH_BACKEND', None)
+SEARCH_MAX_RESULTS = getattr(settings, 'SEARCH_MAX_RESULTS', 50)
+
+# pg_trgm's default threshold for the % operator
+SIMILARITY_THRESHOLD = 0.3
+
+
+class SearchBackend(object):
+    def search(self, queryset, term, limit=SEARCH_MAX_RESULTS):
+        """
+        Returns up to limit users of queryset whose full_name starts with
+        term, ignoring case, followed by the ones most similar to it.
+        """
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    The prefix match compiles to UPPER(full_name) LIKE UPPER('term%'),
+    served by the text_pattern_ops index on UPPER(full_name); the
+    trigram match uses the % operator and the GIN trigram index.
+    """
+    def search(self, queryset, term, limit=SEARCH_MAX_RESULTS):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        prefix = Q(full_name__istartswith=term)
+        return queryset.filter(
+            prefix | Q(full_name__trigram_similar=term)
+        ).annotate(
+            is_prefix=Case(When(prefix, then=Value(1)), default=Value(0),
+                           output_field=IntegerField()),
+            similarity=TrigramSimilarity('full_name', term),
+        ).order_by('-is_prefix', '-similarity', 'id')[:limit]
+
+
+def trigrams(text):
+    """Returns the set of trigrams of text the way pg_trgm builds it."""
+    result = set()
+    for word in re.findall(r'\w+', text.lower(), re.UNICODE):
+        word = '  ' + word + ' '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    return float(len(a & b)) / len(a | b)
+
+
+class InProcessSearchBackend(SearchBackend):
+    """
+    Scans the names of every user in queryset, so it is only meant for
+    small databases.
+    """
+    def search(self, queryset, term, limit=SEARCH_MAX_RESULTS):
+        prefix = term.lower()
+        ranked = []
+        for pk, full_name in queryset.values_list('pk', 'full_name'):
+            is_prefix = full_name.lower().startswith(prefix)
+            score = similarity(full_name, term)
+            if is_prefix or score >= SIMILARITY_THRESHOLD:
+                ranked.append((not is_prefix, -score, pk))
+        ids = [pk for _, _, pk in sorted(ranked)[:limit]]
+        if not ids:
+            return queryset.none()
+        return queryset.filter(pk__in=ids).annotate(
+            rank=Case(*[When(pk=pk, then=Value(i))
+                        for i, pk in enumerate(ids)],
+                      output_field=IntegerField())
+        ).order_by('rank')
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        if SEARCH_BACKEND:
+            _backend = import_string(SEARCH_BACKEND)()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        else:
+            _backend = InProcessSearchBackend()
+    return _backend
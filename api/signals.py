@@ -0,0 +1,122 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from accounts.models import Follower, MyUser, Photo
+from parties.models import Party
+
+from .cache import bump, party_tag, user_tag
+
+
+# MyUser fields that cached responses show or depend on; saves that only
+# touch others, e.g. last_login or times_flagged, invalidate nothing.
+CACHED_USER_FIELDS = frozenset([
+    'full_name', 'email', 'gender', 'profile_pic', 'bio', 'birthday',
+    'phone_number', 'location', 'is_private', 'is_active',
+])
+
+
+def bump_users(user_ids):
+    """
+    Invalidates the cached profiles of the given users and every cached
+    list of users.
+    """
+    bump('users', *[user_tag(user_id) for user_id in user_ids])
+
+
+def bump_parties(party_ids, host_ids=None):
+    """
+    Invalidates the cached parties and the profiles of their hosts, which
+    list the parties they are hosting.
+    """
+    party_ids = list(party_ids)
+    if host_ids is None:
+        host_ids = Party.objects.filter(pk__in=party_ids).values_list(
+            'user_id', flat=True).distinct()
+    bump(*[party_tag(party_id) for party_id in party_ids])
+    bump_users(host_ids)
+
+
+def related_ids(field, instance, action, reverse, pk_set):
+    """
+    Returns the pks on the other side of an m2m_changed signal for field,
+    looking up the rows clear() is about to delete.
+    """
+    if action != 'pre_clear':
+        return set(pk_set)
+    own_column = '{}_id'.format(field.m2m_field_name())
+    other_column = '{}_id'.format(field.m2m_reverse_field_name())
+    if reverse:
+        own_column, other_column = other_column, own_column
+    return set(field.remote_field.through.objects.filter(
+        **{own_column: instance.pk}).values_list(other_column, flat=True))
+
+
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and \
+            not CACHED_USER_FIELDS.intersection(update_fields):
+        return
+    bump_users([instance.pk])
+
+
+def photo_saved(sender, instance, **kwargs):
+    bump_users([instance.user_id])
+
+
+def follower_saved(sender, instance, **kwargs):
+    bump_users([instance.user_id])
+
+
+def party_saved(sender, instance, **kwargs):
+    bump_parties([instance.pk], host_ids=[instance.user_id])
+
+
+def followers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    field = Follower._meta.get_field('followers')
+    follower_ids = related_ids(field, instance, action, reverse, pk_set)
+    follower_ids.add(instance.pk)
+    bump_users(Follower.objects.filter(pk__in=follower_ids).values_list(
+        'user_id', flat=True))
+
+
+def blocking_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    field = MyUser._meta.get_field('blocking')
+    user_ids = related_ids(field, instance, action, reverse, pk_set)
+    user_ids.add(instance.pk)
+    bump_users(user_ids)
+
+
+def party_users_changed(field_name):
+    """
+    Returns an m2m_changed receiver invalidating the parties whose
+    field_name relation changed, from either side of it.
+    """
+    field = Party._meta.get_field(field_name)
+
+    def receiver(sender, instance, action, reverse, pk_set, **kwargs):
+        if action not in ('post_add', 'post_remove', 'pre_clear'):
+            return
+        if reverse:
+            bump_parties(related_ids(field, instance, action, reverse,
+                                     pk_set))
+        else:
+            bump_parties([instance.pk], host_ids=[instance.user_id])
+
+    m2m_changed.connect(receiver, sender=field.remote_field.through,
+                        weak=False,
+                        dispatch_uid='api_cache_party_{}'.format(field_name))
+    return receiver
+
+
+for signal in (post_save, post_delete):
+    signal.connect(user_saved, sender=MyUser)
+    signal.connect(photo_saved, sender=Photo)
+    signal.connect(follower_saved, sender=Follower)
+    signal.connect(party_saved, sender=Party)
+m2m_changed.connect(followers_changed, sender=Follower.followers.through)
+m2m_changed.connect(blocking_changed, sender=MyUser.blocking.through)
+
+for field_name, counter in Party.COUNTER_FIELDS:
+    party_users_changed(field_name)
@@ -3,7 +3,8 @@ from django.conf.urls import url
 from push_notifications.api.rest_framework import APNSDeviceAuthorizedViewSet
 from . import views
 from .views import APIHomeView
-from .views import (AccountCreateAPIView, MyUserDetailAPIView,
+from .views import (AccountCreateAPIView, FollowerListAPIView,
+                    FollowingListAPIView, MyUserDetailAPIView,
                     MyUserListAPIView, PhotoCreateAPIView)
 from .views import FeedAPIView
 from .views import NotificationAPIView, NotificationAjaxAPIView
@@ -48,6 +49,16 @@ urlpatterns = [
         view=MyUserDetailAPIView.as_view(),
         name='user_account_detail_api'
     ),
+    url(
+        regex=r'^accounts/(?P<user_pk>\d+)/followers/$',
+        view=FollowerListAPIView.as_view(),
+        name='user_followers_list_api'
+    ),
+    url(
+        regex=r'^accounts/(?P<user_pk>\d+)/following/$',
+        view=FollowingListAPIView.as_view(),
+        name='user_following_list_api'
+    ),
     url(
         regex=r'^accounts/photos/create/$',
         view=PhotoCreateAPIView.as_view({'post': 'create'}),
@@ -119,6 +130,11 @@ urlpatterns = [
         view=NotificationAjaxAPIView.as_view(),
         name='get_unread_notifications_api'
     ),
+    url(
+        regex=r'^notifications/read/$',
+        view=views.notification_mark_read_api,
+        name='notification_mark_read_api'
+    ),
 
     # P A R T I E S
     url(
@@ -6,37 +6,41 @@ from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response as RestResponse
 from rest_framework.reverse import reverse as api_reverse
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
 from django.conf import settings
 from django.core.mail import send_mail
-from django.db.models import F
+from django.db import transaction
+from django.db.models import F, Q
 from django.shortcuts import get_object_or_404
 from django.views.decorators.cache import never_cache
 
 from accounts.models import Follower, MyUser, Photo
-from core.mixins import AdminRequiredMixin, CacheMixin
-from feed.models import Feed
+from core.mixins import AdminRequiredMixin
+from feed.models import FEED_TIMELINE_LENGTH, Feed
 from feed.signals import feed_item
 from flag.models import Flag
-from notifications.models import Notification
+from notifications.models import Notification, PushMessage
 from notifications.signals import notify
 from parties.models import Party
-from push_notifications.models import APNSDevice
 from .account_serializers import (AccountCreateSerializer, FollowerSerializer,
-                                  MyUserSerializer, PhotoCreateSerializer,
-                                  PhotoSerializer)
+                                  FollowUserSerializer, MyUserSerializer,
+                                  PhotoCreateSerializer, PhotoSerializer)
 from .auth_serializers import (PasswordResetSerializer,
                                PasswordResetConfirmSerializer,
                                PasswordChangeSerializer)
+from .cache import get_stats, party_tag, user_tag
 from .feed_serializers import FeedSerializer
-from .mixins import DefaultsMixin, FiltersMixin
+from .mixins import CacheMixin, DefaultsMixin, FiltersMixin
 from .notification_serializers import NotificationSerializer
-from .pagination import (AccountPagination, NotificationPagination,
-                         PartyPagination)
+from .pagination import (AccountCursorPagination, FollowPagination,
+                         NotificationCursorPagination, NotificationPagination,
+                         PartyCursorPagination, PartyPagination)
 from .party_serializers import PartyCreateSerializer, PartySerializer
 from .permissions import IsOwnerOrReadOnly, MyUserIsOwnerOrReadOnly
+from .search import get_search_backend
 from .search_serializers import SearchMyUserSerializer
 
 # Create your views here.
@@ -73,11 +77,13 @@ class APIHomeView(AdminRequiredMixin, DefaultsMixin, APIView):
                                    kwargs={'user_id': user.id}),
             },
             'notifications': {
-                'count': Notification.objects.unread_for_user(user).count(),
+                'count': Notification.objects.unread_count(user),
                 'url': api_reverse('notification_list_api',
                                    request=request),
                 'unread_url': api_reverse('get_unread_notifications_api',
                                           request=request),
+                'mark_read_url': api_reverse('notification_mark_read_api',
+                                             request=request),
             },
             'parties': {
                 'count': Party.objects.active().count(),
@@ -93,6 +99,7 @@ class APIHomeView(AdminRequiredMixin, DefaultsMixin, APIView):
                 'help_text': "add '?q=searched_parameter' to the "
                              "end of the url to display results"
             },
+            'cache': get_stats(),
         }
         return RestResponse(data)
 
@@ -107,12 +114,13 @@ class AccountCreateAPIView(generics.CreateAPIView):
 
 class MyUserListAPIView(CacheMixin, DefaultsMixin, generics.ListAPIView):
     cache_timeout = 60 * 60 * 24
-    pagination_class = AccountPagination
+    cache_tags = ('users',)
+    pagination_class = AccountCursorPagination
     serializer_class = MyUserSerializer
     queryset = MyUser.objects.all()
 
 
-class MyUserDetailAPIView(generics.RetrieveAPIView,
+class MyUserDetailAPIView(CacheMixin, generics.RetrieveAPIView,
                           mixins.DestroyModelMixin,
                           mixins.UpdateModelMixin):
     cache_timeout = 60 * 5
@@ -131,6 +139,9 @@ class MyUserDetailAPIView(generics.RetrieveAPIView,
                 "You do not have permission to view that profile.")
         return obj
 
+    def get_cache_tags(self):
+        return (user_tag(self.kwargs['user_pk']),)
+
     def delete(self, request, *args, **kwargs):
         return self.destroy(request, *args, **kwargs)
 
@@ -169,35 +180,59 @@ def follow_status_api(request, user_pk):
     except Follower.DoesNotExist:
         user_followed = None
 
-    if user_followed:
-        followed.followers.remove(follower)
-    else:
-        followed.followers.add(follower)
+    with transaction.atomic():
+        if user_followed:
+            followed.followers.remove(follower)
+        else:
+            followed.followers.add(follower)
+            if user in viewing_user.blocking.all():
+                viewing_user.blocking.remove(user)
+
+    if not user_followed:
         notify.send(
             viewing_user,
             recipient=user,
             verb='is now following you.',
         )
 
-        # Push notifications
-        try:
-            device = APNSDevice.objects.get(user=user)
-        except APNSDevice.DoesNotExist:
-            device = None
-
-        if device:
-            device.send_message(
-                "{} is now following you.".format(viewing_user),
-                sound='default'
-            )
-
-        if user in viewing_user.blocking.all():
-            viewing_user.blocking.remove(user)
+        PushMessage.objects.queue(
+            [user], "{} is now following you.".format(viewing_user))
 
     serializer = FollowerSerializer(followed, context={'request': request})
     return RestResponse(serializer.data, status=status.HTTP_200_OK)
 
 
+class FollowListAPIView(DefaultsMixin, generics.ListAPIView):
+    pagination_class = FollowPagination
+    serializer_class = FollowUserSerializer
+
+    def get_user(self):
+        """
+        Returns the user whose follows are listed. Like their profile,
+        they are hidden from the users they block.
+        """
+        user = get_object_or_404(MyUser, pk=self.kwargs["user_pk"])
+
+        if user.blocking.filter(pk=self.request.user.pk).exists():
+            raise PermissionDenied(
+                "You do not have permission to view that profile.")
+        return user
+
+
+class FollowerListAPIView(FollowListAPIView):
+    def get_queryset(self):
+        return MyUser.objects.filter(
+            follower__following__user=self.get_user()).only(
+                'id', 'full_name', 'profile_pic').order_by('id')
+
+
+class FollowingListAPIView(FollowListAPIView):
+    def get_queryset(self):
+        return MyUser.objects.filter(
+            follower__followers__user=self.get_user()).only(
+                'id', 'full_name', 'profile_pic').order_by('id')
+
+
 @api_view(['POST'])
 def block_user_api(request, user_pk):
     viewing_user = request.user
@@ -205,34 +240,36 @@ def block_user_api(request, user_pk):
     follower, created = Follower.objects.get_or_create(user=viewing_user)
     followed, created = Follower.objects.get_or_create(user=user_to_block)
 
-    # Does the viewing_user follow the user_to_block?
-    # If so, remove them
-    try:
-        user_to_block_followed = (Follower.objects.select_related('user')
-                                          .get(user=user_to_block,
-                                               followers=follower))
-    except Follower.DoesNotExist:
-        user_to_block_followed = None
+    with transaction.atomic():
+        # Does the viewing_user follow the user_to_block?
+        # If so, remove them
+        try:
+            user_to_block_followed = (Follower.objects.select_related('user')
+                                              .get(user=user_to_block,
+                                                   followers=follower))
+        except Follower.DoesNotExist:
+            user_to_block_followed = None
 
-    if user_to_block_followed:
-        followed.followers.remove(follower)
+        if user_to_block_followed:
+            followed.followers.remove(follower)
 
-    # Does the user_to_block follow the viewing_user?
-    # If so, remove them
-    try:
-        viewer_followed = (Follower.objects.select_related('user')
-                                           .get(user=viewing_user,
-                                                followers=followed))
-    except Follower.DoesNotExist:
-        viewer_followed = None
+        # Does the user_to_block follow the viewing_user?
+        # If so, remove them
+        try:
+            viewer_followed = (Follower.objects.select_related('user')
+                                               .get(user=viewing_user,
+                                                    followers=followed))
+        except Follower.DoesNotExist:
+            viewer_followed = None
 
-    if viewer_followed:
-        follower.followers.remove(followed)
+        if viewer_followed:
+            follower.followers.remove(followed)
 
-    # Is the user_to_block already in blocked users?
-    if user_to_block not in viewing_user.blocking.all():
-        viewing_user.blocking.add(user_to_block)
+        # Is the user_to_block already in blocked users?
+        if user_to_block not in viewing_user.blocking.all():
+            viewing_user.blocking.add(user_to_block)
 
+    followed.refresh_from_db(fields=['num_followers', 'num_following'])
     serializer = FollowerSerializer(followed, context={'request': request})
     return RestResponse(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -308,8 +345,9 @@ class FeedAPIView(DefaultsMixin, generics.ListAPIView):
     serializer_class = FeedSerializer
 
     def get_queryset(self):
-        user = MyUser.objects.get(id=self.kwargs['user_id'])
-        return Feed.objects.all_for_user(user=user)[:50]
+        return Feed.objects.timeline_for_user(
+            user=self.kwargs['user_id']).prefetch_related(
+                'sender_object', 'target_object')[:FEED_TIMELINE_LENGTH]
 
 
 ########################################################################
@@ -343,27 +381,40 @@ def flag_create_api(request, party_pk):
 ########################################################################
 # NOTIFICATIONS                                                        #
 ########################################################################
-class NotificationAPIView(CacheMixin, DefaultsMixin, generics.ListAPIView):
-    # cache_timeout = 60 * 7
-    pagination_class = NotificationPagination
+class NotificationAPIView(DefaultsMixin, generics.ListAPIView):
+    pagination_class = NotificationCursorPagination
     serializer_class = NotificationSerializer
 
     def get_queryset(self):
         """
-        Update all of the notifications to read=True.
-        Get 50 most recent notifications for the user.
-        Delete all of the notifications older than the 50 displayed.
-        Return the 50 most recent notifications for the user.
+        Returns the most recent notifications for the user. Marking them
+        as read is done by notification_mark_read_api and old
+        notifications are removed by the prune_notifications command.
         """
         user = self.request.user
-        notifications = Notification.objects.all_for_user(user=user)
-        notifications.update(read=True)
-        notifications = notifications[:50]
-        if notifications.count() > 0:
-            delete_after_datetime = list(notifications)[-1].created
-            Notification.objects.all_for_user(user).filter(
-                created__lt=delete_after_datetime).delete()
-        return notifications
+        return Notification.objects.all_for_user(user=user).prefetch_related(
+            'sender_object', 'action_object', 'target_object')
+
+
+@api_view(['POST'])
+def notification_mark_read_api(request):
+    """
+    Marks the user's notifications as read, only up to and including the
+    notification id given as up_to when present. Repeating the request
+    has no further effect.
+    """
+    user = request.user
+    up_to = request.data.get('up_to')
+    if up_to is not None:
+        try:
+            up_to = int(up_to)
+        except (TypeError, ValueError):
+            raise ValidationError({'up_to': 'A notification id is required.'})
+    marked = Notification.objects.mark_all_read(user, up_to=up_to)
+    return RestResponse({
+        'marked': marked,
+        'unread_count': Notification.objects.unread_count(user),
+    }, status=status.HTTP_200_OK)
 
 
 class NotificationAjaxAPIView(DefaultsMixin, generics.ListAPIView):
@@ -421,27 +472,18 @@ class PartyCreateAPIView(ModelViewSet):
         user_ids = data.get('invited_user_ids')
 
         if user_ids:
-            for user_id in user_ids.split(','):
-                invited = MyUser.objects.get(id=user_id)
-                party.invited_users.add(invited)
-                notify.send(
-                    user,
-                    recipient=invited,
-                    verb='has invited you to an event.',
-                    target=party,
-                )
-
-                # Push notifications
-                try:
-                    device = APNSDevice.objects.get(user=invited)
-                except APNSDevice.DoesNotExist:
-                    device = None
-
-                if device:
-                    device.send_message(
-                        "{} has invited you to an event.".format(user),
-                        sound='default'
-                    )
+            invited_users = list(
+                MyUser.objects.filter(id__in=user_ids.split(',')))
+            party.invited_users.add(*invited_users)
+            notify.send(
+                user,
+                affected_users=invited_users,
+                verb='has invited you to an event.',
+                target=party,
+            )
+
+            PushMessage.objects.queue(
+                invited_users, "{} has invited you to an event.".format(user))
 
         if party.invite_type != Party.INVITE_ONLY:
             feed_item.send(
@@ -505,39 +547,30 @@ class PartyCreateAPIView(ModelViewSet):
         return serializer
 
 
-class PartyDetailAPIView(generics.RetrieveAPIView,
+class PartyDetailAPIView(CacheMixin, generics.RetrieveAPIView,
                          mixins.DestroyModelMixin,
                          mixins.UpdateModelMixin):
+    cache_timeout = 60 * 5
     permission_classes = (permissions.IsAuthenticated, IsOwnerOrReadOnly,)
     serializer_class = PartySerializer
 
     def get_object(self):
         obj = get_object_or_404(Party, pk=self.kwargs["party_pk"])
-        now = datetime.now()
-        if obj.end_time:
-            if obj.end_time < obj.start_time:
-                expires_on = datetime(
-                    obj.party_year,
-                    obj.party_month,
-                    obj.party_day,
-                    int(obj.end_time.strftime('%H')),
-                    int(obj.end_time.strftime('%M'))
-                )
-                expires_on += timedelta(days=1)
-            else:
-                expires_on = datetime(
-                    obj.party_year, obj.party_month, obj.party_day,
-                    int(obj.end_time.strftime('%H')),
-                    int(obj.end_time.strftime('%M')))
-            obj.is_active = False if expires_on <= now else True
-        else:
-            expires_on = date(
-                obj.party_year, obj.party_month, obj.party_day
-            )
-            obj.is_active = False if now.date() > expires_on else True
-        obj.save(update_fields=['is_active'])
+        # The expire_parties command persists this in bulk.
+        obj.is_active = obj.is_active and not obj.has_ended
+        self.party = obj
         return obj
 
+    def get_cache_tags(self):
+        return (party_tag(self.kwargs['party_pk']),)
+
+    def get_cache_timeout(self):
+        # Don't keep serving the party as active once it has ended
+        if self.party.has_ended or self.party.ends_at is None:
+            return self.cache_timeout
+        remaining = (self.party.ends_at - datetime.now()).total_seconds()
+        return min(self.cache_timeout, int(remaining))
+
     def delete(self, request, *args, **kwargs):
         return self.destroy(request, *args, **kwargs)
 
@@ -546,7 +579,7 @@ class PartyDetailAPIView(generics.RetrieveAPIView,
 
 
 class PartyListAPIView(DefaultsMixin, FiltersMixin, generics.ListAPIView):
-    pagination_class = PartyPagination
+    pagination_class = PartyCursorPagination
     serializer_class = PartySerializer
     search_fields = ('user__email', 'user__full_name',
                      'attendees__email', 'attendees__full_name',
@@ -560,18 +593,13 @@ class PartyListAPIView(DefaultsMixin, FiltersMixin, generics.ListAPIView):
         return super(PartyListAPIView, self).dispatch(*args, **kwargs)
 
     def get_queryset(self):
-        qs = Party.objects.active().exclude(invite_type=Party.INVITE_ONLY)
-        to_remove_ids = []
-
-        for party in qs:
-            start_date = date(party.party_year,
-                              party.party_month,
-                              party.party_day)
-            if party.recurrence != Party.NONE and start_date > date.today():
-                to_remove_ids.append(party.id)
-        return qs.exclude(id__in=to_remove_ids).order_by(
-            'party_year', 'party_month', 'party_day', 'start_time'
-        )
+        # Recurring parties only show up once their day has come.
+        tomorrow = datetime.combine(date.today() + timedelta(days=1),
+                                    datetime.min.time())
+        return Party.objects.active().exclude(
+            invite_type=Party.INVITE_ONLY).exclude(
+                ~Q(recurrence=Party.NONE), starts_at__gte=tomorrow
+            ).order_by('starts_at', 'id')
 
 
 class OwnPartyListAPIView(DefaultsMixin, FiltersMixin, generics.ListAPIView):
@@ -622,17 +650,9 @@ def party_attend_api(request, party_pk):
                 target=party,
             )
 
-            # Push notifications
-            try:
-                device = APNSDevice.objects.get(user=party_creator)
-            except APNSDevice.DoesNotExist:
-                device = None
-
-            if device:
-                device.send_message(
-                    "{} has requested to attend your event.".format(user),
-                    sound='default'
-                )
+            PushMessage.objects.queue(
+                [party_creator],
+                "{} has requested to attend your event.".format(user))
     elif party.invite_type == Party.OPEN:
         party.attendees.add(user)
         if user != party_creator:
@@ -643,17 +663,9 @@ def party_attend_api(request, party_pk):
                 target=party,
             )
 
-            # Push notifications
-            try:
-                device = APNSDevice.objects.get(user=party_creator)
-            except APNSDevice.DoesNotExist:
-                device = None
-
-            if device:
-                device.send_message(
-                    "{} will be attending your event.".format(user),
-                    sound='default'
-                )
+            PushMessage.objects.queue(
+                [party_creator],
+                "{} will be attending your event.".format(user))
 
             feed_item.send(
                 user,
@@ -671,17 +683,9 @@ def party_attend_api(request, party_pk):
                 target=party,
             )
 
-            # Push notifications
-            try:
-                device = APNSDevice.objects.get(user=party_creator)
-            except APNSDevice.DoesNotExist:
-                device = None
-
-            if device:
-                device.send_message(
-                    "{} will be attending your event.".format(user),
-                    sound='default'
-                )
+            PushMessage.objects.queue(
+                [party_creator],
+                "{} will be attending your event.".format(user))
 
             feed_item.send(
                 user,
@@ -690,7 +694,7 @@ def party_attend_api(request, party_pk):
                 target=party,
             )
 
-    party.save()
+    party.save(update_fields=['modified'])
     serializer = PartySerializer(party, context={'request': request})
     return RestResponse(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -709,17 +713,9 @@ def requester_approve_api(request, party_pk, user_pk):
         target=party,
     )
 
-    # Push notifications
-    try:
-        device = APNSDevice.objects.get(user=user)
-    except APNSDevice.DoesNotExist:
-        device = None
-
-    if device:
-        device.send_message(
-            "{} has accepted your request to attend.".format(party_creator),
-            sound='default'
-        )
+    PushMessage.objects.queue(
+        [user],
+        "{} has accepted your request to attend.".format(party_creator))
 
     feed_item.send(
         user,
@@ -755,14 +751,20 @@ def party_like_api(request, party_pk):
 ########################################################################
 # SEARCH                                                               #
 ########################################################################
-class SearchListAPIView(CacheMixin, DefaultsMixin, FiltersMixin,
-                        generics.ListAPIView):
+class SearchListAPIView(CacheMixin, DefaultsMixin, generics.ListAPIView):
     serializer_class = SearchMyUserSerializer
-    # '^' Starts-with search
-    # '=' Exact matches
-    # '$' Regex search
-    search_fields = ('^full_name',)
+
+    def get_cache_tags(self):
+        # Any user's name may change or a new one match, and following
+        # and blocking change who the viewer may find.
+        return ('users', user_tag(self.request.user.pk))
 
     def get_queryset(self):
-        return MyUser.objects.exclude(pk=self.request.user.pk).filter(
-            is_active=True).only('id', 'full_name', 'profile_pic')
+        queryset = MyUser.objects.visible_to(self.request.user).only(
+            'id', 'full_name', 'profile_pic')
+        term = self.request.query_params.get(
+            api_settings.SEARCH_PARAM, '').strip()
+        if not term:
+            # Every user would match, so there's nothing worth listing
+            return queryset.none()
+        return get_search_backend().search(queryset, term)
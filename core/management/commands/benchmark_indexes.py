@@ -0,0 +1,106 @@
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from feed.models import Feed
+from notifications.models import Notification
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Seeds notifications and feed items, then prints the query plans '
+            'of their listing queries with and without the composite indexes. '
+            'Everything, including the dropped indexes, is rolled back. '
+            'PostgreSQL only; DROP INDEX locks the tables until the end, so '
+            'run it against a copy of the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000000,
+                            help='Number of notifications and of feed items '
+                                 'to seed')
+        parser.add_argument('--users', type=int, default=10000,
+                            help='Number of users the rows are spread over')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('benchmark_indexes needs PostgreSQL, not %s'
+                               % connection.vendor)
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    user_ids = self.seed(cursor, options['rows'],
+                                         options['users'])
+                    self.explain_all(cursor, user_ids)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, cursor, rows, users):
+        User = get_user_model()
+        User.objects.bulk_create(
+            User(email='benchmark{}@example.com'.format(i),
+                 full_name='Benchmark User')
+            for i in range(users))
+        user_ids = list(User.objects.filter(
+            email__startswith='benchmark').values_list('id', flat=True))
+        user_type = ContentType.objects.get_for_model(User)
+
+        self.stdout.write('seeding %d notifications and feed items' % rows)
+        cursor.execute(
+            'INSERT INTO {table} (sender_content_type_id, sender_object_id, '
+            'verb, recipient_id, read, created, modified) '
+            'SELECT %s, ids[1 + i %% %s], %s, ids[1 + (i * 7) %% %s], '
+            'random() < 0.8, now() - i * interval \'1 second\', now() '
+            'FROM generate_series(1, %s) AS i, (SELECT %s::int[] AS ids) AS u'
+            .format(table=Notification._meta.db_table),
+            [user_type.pk, len(user_ids), 'benchmark', len(user_ids), rows,
+             user_ids])
+        cursor.execute(
+            'INSERT INTO {table} (sender_content_type_id, sender_object_id, '
+            'verb, created, modified) '
+            'SELECT %s, ids[1 + i %% %s], %s, '
+            'now() - i * interval \'1 second\', now() '
+            'FROM generate_series(1, %s) AS i, (SELECT %s::int[] AS ids) AS u'
+            .format(table=Feed._meta.db_table),
+            [user_type.pk, len(user_ids), 'benchmark', rows, user_ids])
+        for model in (Notification, Feed):
+            cursor.execute('ANALYZE %s' % model._meta.db_table)
+        return user_ids
+
+    def explain_all(self, cursor, user_ids):
+        user = get_user_model().objects.get(pk=user_ids[0])
+        queries = [
+            ('notifications', Notification.objects.all_for_user(user)[:50]),
+            ('unread notifications',
+             Notification.objects.unread_for_user(user)[:50]),
+            ('feed', Feed.objects.filter(
+                sender_object_id__in=user_ids[:100])[:50]),
+        ]
+
+        plans = dict((name, self.explain(cursor, queryset))
+                     for name, queryset in queries)
+        for model in (Notification, Feed):
+            self.drop_composite_indexes(cursor, model)
+        for name, queryset in queries:
+            self.stdout.write('== %s without composite indexes' % name)
+            self.stdout.write(self.explain(cursor, queryset))
+            self.stdout.write('== %s with composite indexes' % name)
+            self.stdout.write(plans[name])
+
+    def explain(self, cursor, queryset):
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def drop_composite_indexes(self, cursor, model):
+        table = model._meta.db_table
+        constraints = connection.introspection.get_constraints(cursor, table)
+        for name, info in constraints.items():
+            if info['index'] and len(info['columns']) > 1 \
+                    and not info['primary_key'] and not info['unique']:
+                cursor.execute('DROP INDEX %s' %
+                               connection.ops.quote_name(name))
@@ -2,7 +2,6 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.http import Http404
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 
 
 class AdminRequiredMixin(object):
@@ -29,14 +28,3 @@ class LoginRequiredMixin(object):
     def dispatch(self, request, *args, **kwargs):
         return super(LoginRequiredMixin, self).dispatch(request,
                                                         *args, **kwargs)
-
-
-class CacheMixin(object):
-    cache_timeout = 60
-
-    def get_cache_timeout(self):
-        return self.cache_timeout
-
-    def dispatch(self, *args, **kwargs):
-        return cache_page(self.get_cache_timeout())(
-            super(CacheMixin, self).dispatch)(*args, **kwargs)
@@ -1,3 +1,14 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import TestCase
 
 # Create your tests here.
+
+
+class BenchmarkIndexesTest(TestCase):
+    def test_requires_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('only checks the refusal on other databases')
+        with self.assertRaises(CommandError):
+            call_command('benchmark_indexes', rows=10, users=2)
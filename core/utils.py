@@ -1,3 +1,6 @@
+from django.contrib.contenttypes.models import ContentType
+
+
 def jwt_response_payload_handler(token, user=None, request=None):
     return {
         "token": token,
@@ -8,6 +11,23 @@ def jwt_response_payload_handler(token, user=None, request=None):
     }
 
 
+def generic_relation_fields(sender, target=None, action=None):
+    """
+    Returns the sender/target/action generic relation field values for
+    a notification or feed item, resolving each content type once.
+    """
+    fields = {
+        'sender_content_type': ContentType.objects.get_for_model(sender),
+        'sender_object_id': sender.id,
+    }
+    for option, obj in (("target", target), ("action", action)):
+        if obj is not None:
+            fields["{}_content_type".format(option)] = \
+                ContentType.objects.get_for_model(obj)
+            fields["{}_object_id".format(option)] = obj.id
+    return fields
+
+
 def readable_number(value, short=False):
     """
     Returns an abbreviated value for numbers over 1,000.
@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from feed.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Fills the feed timelines of users that do not have one yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='user_ids',
+                            type=int, default=[],
+                            help='Only backfill the timeline of this user id')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(timeline__isnull=True)
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        count = 0
+        for user in users.distinct().iterator():
+            TimelineEntry.objects.rebuild_for_user(user)
+            count += 1
+        self.stdout.write('backfilled %d timelines' % count)
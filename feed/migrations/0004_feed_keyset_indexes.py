@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 09:58
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0003_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='feed',
+            index_together=set([('sender_object_id', 'created', 'id')]),
+        ),
+    ]
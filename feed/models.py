@@ -1,9 +1,10 @@
 from __future__ import unicode_literals
 
+from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.humanize.templatetags.humanize import naturaltime
-from django.db import models
+from django.db import connection, models
 from django.utils.encoding import python_2_unicode_compatible
 
 from accounts.models import Follower
@@ -12,6 +13,10 @@ from core.models import TimeStampedModel
 # Create your models here.
 
 
+FEED_BATCH_SIZE = getattr(settings, 'FEED_BATCH_SIZE', 500)
+FEED_TIMELINE_LENGTH = getattr(settings, 'FEED_TIMELINE_LENGTH', 50)
+
+
 class FeedManager(models.Manager):
     def all_for_user(self, user):
         """
@@ -30,6 +35,13 @@ class FeedManager(models.Manager):
             return (own_feed | following_feed).distinct()
         return own_feed
 
+    def timeline_for_user(self, user):
+        """
+        Returns the precomputed timeline of feed items for the user.
+        """
+        return self.filter(timeline_entries__user=user).order_by(
+            '-timeline_entries__created')
+
 
 @python_2_unicode_compatible
 class Feed(TimeStampedModel):
@@ -59,6 +71,7 @@ class Feed(TimeStampedModel):
     class Meta:
         ordering = ['-created']
         app_label = 'feed'
+        index_together = [('sender_object_id', 'created', 'id')]
 
     def __str__(self):
         context = {
@@ -72,3 +85,113 @@ class Feed(TimeStampedModel):
     @property
     def time_since(self):
         return naturaltime(self.created)
+
+
+class TimelineEntryManager(models.Manager):
+    def fan_out(self, items):
+        """
+        Pushes the feed items into the timeline of their sender and
+        of everyone following the sender, then trims those timelines
+        back to FEED_TIMELINE_LENGTH entries.
+        """
+        recipients = {}
+        entries = []
+        for item in items:
+            sender_id = item.sender_object_id
+            if sender_id not in recipients:
+                user_ids = set(Follower.objects.filter(
+                    following__user_id=sender_id).values_list(
+                        'user_id', flat=True))
+                user_ids.add(sender_id)
+                recipients[sender_id] = user_ids
+            entries.extend(
+                self.model(user_id=user_id, feed_item=item,
+                           created=item.created)
+                for user_id in recipients[sender_id])
+        entries = self.bulk_create(entries, batch_size=FEED_BATCH_SIZE)
+        self.trim(set().union(*recipients.values()))
+        return entries
+
+    def add_sender(self, user_id, sender_id):
+        """
+        Pushes the newest feed items of sender_id into the timeline of
+        user_id, who just started following them.
+        """
+        items = Feed.objects.filter(sender_object_id=sender_id).exclude(
+            timeline_entries__user_id=user_id).order_by(
+                '-created').values_list('id', 'created')[:FEED_TIMELINE_LENGTH]
+        entries = self.bulk_create(
+            [self.model(user_id=user_id, feed_item_id=item_id,
+                        created=created)
+             for item_id, created in items],
+            batch_size=FEED_BATCH_SIZE)
+        self.trim([user_id])
+        return entries
+
+    def remove_sender(self, user_id, sender_id):
+        """
+        Drops the feed items of sender_id from the timeline of user_id,
+        who just stopped following them.
+        """
+        return self.filter(user_id=user_id,
+                           feed_item__sender_object_id=sender_id).delete()
+
+    def trim(self, user_ids):
+        """
+        Deletes the entries older than the FEED_TIMELINE_LENGTH newest
+        ones of each user, with one DELETE per FEED_BATCH_SIZE users.
+        """
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        user_ids = list(user_ids)
+        deleted = 0
+        for start in range(0, len(user_ids), FEED_BATCH_SIZE):
+            batch = user_ids[start:start + FEED_BATCH_SIZE]
+            # The subquery walks the (user, created) index down to the
+            # oldest entry that is kept; it is NULL for short timelines.
+            sql = (
+                'DELETE FROM {table} WHERE user_id IN ({ids}) AND created < '
+                '(SELECT kept.created FROM {table} kept '
+                'WHERE kept.user_id = {table}.user_id '
+                'ORDER BY kept.created DESC LIMIT 1 OFFSET %s)'
+            ).format(table=table, ids=', '.join(['%s'] * len(batch)))
+            with connection.cursor() as cursor:
+                cursor.execute(sql, batch + [FEED_TIMELINE_LENGTH - 1])
+                deleted += cursor.rowcount
+        return deleted
+
+    def rebuild_for_user(self, user):
+        """
+        Recomputes the timeline of the user from the feed items of
+        the user and of the users they follow, keeping the newest
+        FEED_TIMELINE_LENGTH items.
+        """
+        self.filter(user=user).delete()
+        items = Feed.objects.all_for_user(user).values_list(
+            'id', 'created')[:FEED_TIMELINE_LENGTH]
+        return self.bulk_create(
+            [self.model(user=user, feed_item_id=item_id, created=created)
+             for item_id, created in items],
+            batch_size=FEED_BATCH_SIZE)
+
+
+@python_2_unicode_compatible
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             related_name='timeline',
+                             on_delete=models.CASCADE)
+    feed_item = models.ForeignKey(Feed, related_name='timeline_entries',
+                                  on_delete=models.CASCADE)
+    # Copy of feed_item.created so a timeline is read with a single
+    # range scan over the (user, created) index.
+    created = models.DateTimeField()
+
+    objects = TimelineEntryManager()
+
+    class Meta:
+        ordering = ['-created']
+        app_label = 'feed'
+        index_together = [('user', 'created')]
+        verbose_name_plural = 'timeline entries'
+
+    def __str__(self):
+        return str(self.feed_item_id)
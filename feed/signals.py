@@ -1,49 +1,75 @@
-from django.contrib.contenttypes.models import ContentType
+from django.db.models import Max
+from django.db.models.signals import m2m_changed
 from django.dispatch import Signal
 
-from .models import Feed
+from accounts.models import Follower
+from core.utils import generic_relation_fields
+from .models import FEED_BATCH_SIZE, Feed, TimelineEntry
 
 
 feed_item = Signal(
-    providing_args=['verb', 'action', 'target', 'affected_users'])
+    providing_args=['verb', 'action', 'target', 'affected_users',
+                    'batch_size'])
 
 
 def new_feed_item(sender, **kwargs):
+    """
+    Creates the feed item, or one feed item per user in affected_users
+    written with bulk inserts of batch_size rows, and pushes the items
+    into the timelines of the sender's followers.
+
+    Returns the created feed items.
+    """
     kwargs.pop('signal', None)
     affected_users = kwargs.pop('affected_users', None)
     verb = kwargs.pop("verb")
+    batch_size = kwargs.pop('batch_size', FEED_BATCH_SIZE)
+    fields = generic_relation_fields(sender, target=kwargs.get("target"),
+                                     action=kwargs.get("action"))
 
     if affected_users is not None:
-        for user in affected_users:
-            new_item = Feed(
-                verb=verb,
-                sender_content_type=ContentType.objects.get_for_model(sender),
-                sender_object_id=sender.id,
-            )
-            for option in ("target", "action"):
-                try:
-                    obj = kwargs[option]
-                    if obj is not None:
-                        setattr(new_item, "{}_content_type".format(option),
-                                ContentType.objects.get_for_model(obj))
-                        setattr(new_item, "{}_object_id".format(option),
-                                obj.id)
-                except StandardError:
-                    pass
-            new_item.save()
+        last_id = Feed.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        items = Feed.objects.bulk_create(
+            [Feed(verb=verb, **fields) for user in affected_users],
+            batch_size=batch_size)
+        if not all(item.pk for item in items):
+            # Only some backends (PostgreSQL) return ids from bulk
+            # inserts, and timeline entries need them.
+            items = list(Feed.objects.filter(
+                id__gt=last_id, verb=verb, **fields).order_by('id'))
     else:
-        new_item = Feed(
-            verb=verb,
-            sender_content_type=ContentType.objects.get_for_model(sender),
-            sender_object_id=sender.id,
-        )
-        for option in ("target", "action"):
-            obj = kwargs.pop(option, None)
-            if obj is not None:
-                setattr(new_item, "{}_content_type".format(option),
-                        ContentType.objects.get_for_model(obj))
-                setattr(new_item, "{}_object_id".format(option), obj.id)
+        new_item = Feed(verb=verb, **fields)
         new_item.save()
+        items = [new_item]
+
+    TimelineEntry.objects.fan_out(items)
+    return items
+
+
+def update_follower_timelines(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    """
+    Pushes the newest feed items of a followed user into the timeline
+    of their new follower, and drops them again on unfollow.
+    """
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    # followed.followers.add(follower) is the forward side and
+    # follower.following.add(followed) the reverse one.
+    other_user_ids = Follower.objects.filter(pk__in=pk_set).values_list(
+        'user_id', flat=True)
+    if reverse:
+        pairs = [(instance.user_id, user_id) for user_id in other_user_ids]
+    else:
+        pairs = [(user_id, instance.user_id) for user_id in other_user_ids]
+
+    for user_id, sender_id in pairs:
+        if action == 'post_add':
+            TimelineEntry.objects.add_sender(user_id, sender_id)
+        else:
+            TimelineEntry.objects.remove_sender(user_id, sender_id)
 
 
 feed_item.connect(new_feed_item)
+m2m_changed.connect(update_follower_timelines,
+                    sender=Follower.followers.through)
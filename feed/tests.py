@@ -1,3 +1,127 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.utils.six import StringIO
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.models import Follower, MyUser
+from feed import models as feed_models
+from feed.models import Feed, TimelineEntry
+from feed.signals import feed_item
+
+
+def make_user(email, full_name='Test User', password='abc1234'):
+    return MyUser.objects.create_user(email=email, full_name=full_name,
+                                      password=password)
+
+
+class TimelineFanOutTest(TestCase):
+    def setUp(self):
+        self.host = make_user('host@test.com')
+        self.fan = make_user('fan@test.com')
+        self.stranger = make_user('stranger@test.com')
+        Follower.objects.get_or_create(user=self.host)[0].followers.add(
+            Follower.objects.get_or_create(user=self.fan)[0])
+
+    def test_item_pushed_to_sender_and_followers(self):
+        feed_item.send(self.host, verb='hosting an event.')
+        item = Feed.objects.get()
+        self.assertEqual(list(Feed.objects.timeline_for_user(self.host)),
+                         [item])
+        self.assertEqual(list(Feed.objects.timeline_for_user(self.fan)),
+                         [item])
+        self.assertFalse(Feed.objects.timeline_for_user(self.stranger))
+
+    def test_timeline_matches_all_for_user(self):
+        feed_item.send(self.host, verb='hosting an event.')
+        feed_item.send(self.stranger, verb='hosting an event.')
+        feed_item.send(self.fan, verb='hosting an event.')
+        self.assertEqual(list(Feed.objects.timeline_for_user(self.fan)),
+                         list(Feed.objects.all_for_user(self.fan)))
+
+    def test_follow_rebuilds_timeline(self):
+        feed_item.send(self.stranger, verb='hosting an event.')
+        self.assertFalse(Feed.objects.timeline_for_user(self.fan))
+
+        Follower.objects.get_or_create(user=self.stranger)[0].followers.add(
+            self.fan.follower)
+        self.assertEqual(Feed.objects.timeline_for_user(self.fan).count(), 1)
+
+        self.stranger.follower.followers.remove(self.fan.follower)
+        self.assertFalse(Feed.objects.timeline_for_user(self.fan))
+
+    def test_affected_users_items_are_fanned_out(self):
+        items = feed_item.send(
+            self.host, verb='invited you.',
+            affected_users=[self.fan, self.stranger])[0][1]
+        self.assertEqual(len(items), 2)
+        self.assertTrue(all(item.pk for item in items))
+        self.assertEqual(
+            set(Feed.objects.timeline_for_user(self.fan)), set(items))
+        self.assertEqual(
+            set(Feed.objects.timeline_for_user(self.host)), set(items))
+
+    def test_timelines_are_capped(self):
+        old_length = feed_models.FEED_TIMELINE_LENGTH
+        feed_models.FEED_TIMELINE_LENGTH = 3
+        try:
+            for i in range(5):
+                feed_item.send(self.host, verb='hosting an event.')
+            newest = list(Feed.objects.order_by('-created', '-id')[:3])
+            for user in (self.host, self.fan):
+                self.assertEqual(
+                    list(Feed.objects.timeline_for_user(user)), newest)
+
+            feed_item.send(self.stranger, verb='hosting an event.')
+            Follower.objects.get_or_create(user=self.stranger)[0] \
+                .followers.add(self.fan.follower)
+            self.assertEqual(TimelineEntry.objects.filter(
+                user=self.fan).count(), 3)
+        finally:
+            feed_models.FEED_TIMELINE_LENGTH = old_length
+
+    def test_rebuild_for_user(self):
+        feed_item.send(self.host, verb='hosting an event.')
+        TimelineEntry.objects.all().delete()
+        TimelineEntry.objects.rebuild_for_user(self.fan)
+        self.assertEqual(Feed.objects.timeline_for_user(self.fan).count(), 1)
+
+    def test_backfill_command(self):
+        feed_item.send(self.host, verb='hosting an event.')
+        TimelineEntry.objects.filter(user=self.fan).delete()
+        out = StringIO()
+        call_command('backfill_timelines', stdout=out)
+        self.assertIn('backfilled 2 timelines', out.getvalue())
+        self.assertEqual(Feed.objects.timeline_for_user(self.fan).count(), 1)
+
+
+class FeedAPIQueryCountTest(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer@test.com')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+        self.url = reverse('feed_list_api', kwargs={'user_id': self.viewer.id})
+        cache.clear()
+
+    def add_items(self, count):
+        viewer_follower = Follower.objects.get_or_create(user=self.viewer)[0]
+        for i in range(count):
+            sender = make_user('sender{}@test.com'.format(
+                Feed.objects.count()))
+            Follower.objects.get_or_create(user=sender)[0].followers.add(
+                viewer_follower)
+            feed_item.send(sender, verb='hosting an event.', target=sender)
+
+    def test_page_cost_is_constant(self):
+        self.add_items(2)
+        # Timeline, senders and targets: one query each.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 2)
+
+        self.add_items(10)
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 12)
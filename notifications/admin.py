@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Notification
+from .models import Notification, PushMessage
 
 # Register your models here.
 
@@ -14,3 +14,16 @@ class NotificationAdmin(admin.ModelAdmin):
 
     class Meta:
         model = Notification
+
+
+@admin.register(PushMessage)
+class PushMessageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'recipient', 'message', 'status', 'platforms',
+                    'attempts', 'next_attempt_at']
+    list_display_links = ('id', 'recipient',)
+    list_filter = ['status']
+    raw_id_fields = ['recipient']
+    readonly_fields = ['created', 'modified']
+
+    class Meta:
+        model = PushMessage
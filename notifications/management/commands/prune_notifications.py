@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from notifications.models import Notification
+
+
+NOTIFICATIONS_KEEP = getattr(settings, 'NOTIFICATIONS_KEEP', 50)
+
+
+class Command(BaseCommand):
+    help = ('Deletes all but the newest notifications of each user, '
+            'in chunks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=NOTIFICATIONS_KEEP,
+                            help='Number of notifications kept per user')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of notifications deleted per query')
+
+    def handle(self, *args, **options):
+        keep = options['keep']
+        chunk_size = options['chunk_size']
+        user_ids = list(
+            Notification.objects.order_by().values('recipient')
+            .annotate(total=Count('id')).filter(total__gt=keep)
+            .values_list('recipient', flat=True))
+
+        deleted = 0
+        for user_id in user_ids:
+            older = Notification.objects.filter(recipient_id=user_id) \
+                .order_by('-created', '-id').values_list('id', flat=True)
+            while True:
+                chunk = list(older[keep:keep + chunk_size])
+                if not chunk:
+                    break
+                Notification.objects.filter(id__in=chunk).delete()
+                deleted += len(chunk)
+        # Unread notifications may have been deleted
+        Notification.objects.forget_unread(user_ids)
+        self.stdout.write('deleted %d notifications of %d users'
+                          % (deleted, len(user_ids)))
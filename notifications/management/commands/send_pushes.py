@@ -0,0 +1,96 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.utils import timezone
+
+from notifications.models import Notification, PushMessage
+from push_notifications.dispatch import send_to_users
+
+
+PUSH_BATCH_SIZE = getattr(settings, 'PUSH_BATCH_SIZE', 500)
+PUSH_MAX_ATTEMPTS = getattr(settings, 'PUSH_MAX_ATTEMPTS', 3)
+PUSH_RETRY_DELAY = getattr(settings, 'PUSH_RETRY_DELAY', 60)
+
+
+class Command(BaseCommand):
+    help = ('Sends queued push notifications in batches, one bulk send '
+            'per platform for each distinct message')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PUSH_BATCH_SIZE,
+                            help='Number of queued messages sent per batch')
+        parser.add_argument('--max-attempts', type=int,
+                            default=PUSH_MAX_ATTEMPTS,
+                            help='Give up on a message after this many '
+                                 'failed sends')
+        parser.add_argument('--loop', action='store_true', default=False,
+                            help='Keep polling the queue instead of exiting '
+                                 'once it is empty')
+        parser.add_argument('--sleep', type=float, default=2.0,
+                            help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **options):
+        sent = failed = 0
+        while True:
+            batch_sent, batch_failed = self.send_batch(
+                options['batch_size'], options['max_attempts'])
+            sent += batch_sent
+            failed += batch_failed
+            if not batch_sent and not batch_failed:
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        self.stdout.write('sent %d messages, %d failed' % (sent, failed))
+
+    def send_batch(self, batch_size, max_attempts):
+        """
+        Claims the oldest pending messages and sends them, grouping
+        recipients that share the same message, sound and platforms still
+        to send to into a single bulk send per platform. APNS badges are
+        set to each recipient's unread notification count.
+
+        Nothing is locked while sending; each group's result is recorded
+        as soon as it is known. Only the platforms that failed are retried,
+        after PUSH_RETRY_DELAY seconds doubled for every earlier attempt.
+
+        Returns the number of messages sent and of messages with a failed
+        platform.
+        """
+        sent = failed = 0
+        batch = PushMessage.objects.claim(batch_size)
+        groups = defaultdict(list)
+        for pk, recipient_id, message, sound, platforms, attempts in batch:
+            groups[(message, sound, platforms, attempts)].append(
+                (pk, recipient_id))
+        badges = Notification.objects.unread_counts(
+            set(row[1] for row in batch))
+
+        for (message, sound, platforms, attempts), rows in groups.items():
+            messages = PushMessage.objects.filter(
+                id__in=[pk for pk, _ in rows])
+            platforms = platforms.split(',') if platforms else []
+            results, errors = send_to_users(
+                set(recipient_id for _, recipient_id in rows), message,
+                sound=sound or None, badge=badges.get, platforms=platforms)
+            if not errors:
+                messages.update(status=PushMessage.SENT, platforms='',
+                                attempts=F('attempts') + 1, error='')
+                sent += len(rows)
+                continue
+
+            delay = PUSH_RETRY_DELAY * 2 ** attempts
+            messages.update(
+                status=PushMessage.PENDING,
+                platforms=','.join(p for p in platforms if p in errors),
+                attempts=F('attempts') + 1,
+                next_attempt_at=timezone.now() + timedelta(seconds=delay),
+                error='\n'.join('%s: %s' % (platform, errors[platform])
+                                 for platform in sorted(errors)))
+            messages.filter(attempts__gte=max_attempts).update(
+                status=PushMessage.FAILED)
+            failed += len(rows)
+        return sent, failed
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 09:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_pushmessage_sending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pushmessage',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='pushmessage',
+            name='platforms',
+            field=models.CharField(blank=True, default='apns,gcm,wns', max_length=20),
+        ),
+        migrations.AlterIndexTogether(
+            name='pushmessage',
+            index_together=set([('status', 'next_attempt_at')]),
+        ),
+    ]
@@ -1,9 +1,13 @@
 from __future__ import unicode_literals
 
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 
 from core.models import TimeStampedModel
@@ -11,6 +15,16 @@ from core.models import TimeStampedModel
 # Create your models here.
 
 
+NOTIFICATIONS_UNREAD_TIMEOUT = getattr(settings,
+                                       'NOTIFICATIONS_UNREAD_TIMEOUT',
+                                       60 * 60 * 24)
+PUSH_CLAIM_TIMEOUT = getattr(settings, 'PUSH_CLAIM_TIMEOUT', 60 * 10)
+
+
+def _unread_cache_key(user_id):
+    return 'notifications:unread:%s' % user_id
+
+
 class NotificationManager(models.Manager):
     def all_for_user(self, user):
         """
@@ -40,9 +54,72 @@ class NotificationManager(models.Manager):
         return super(NotificationManager, self).get_queryset().filter(
             recipient=user)[:num]
 
-    def mark_all_read(self, user):
-        return super(NotificationManager, self).get_queryset() \
-            .filter(recipient=user).update(read=True)
+    def unread_count(self, user):
+        """
+        Returns the number of unread notifications for the user, from the
+        cache when possible.
+        """
+        return self.unread_counts([user.pk])[user.pk]
+
+    def unread_counts(self, user_ids):
+        """
+        Returns a dict of user id to unread notification count. Counts
+        missing from the cache are computed with a single grouped COUNT
+        and cached.
+        """
+        keys = dict((_unread_cache_key(user_id), user_id)
+                    for user_id in user_ids)
+        counts = dict((keys[key], count)
+                      for key, count in cache.get_many(keys).items())
+        missing = set(keys.values()) - set(counts)
+        if missing:
+            fresh = dict.fromkeys(missing, 0)
+            fresh.update(super(NotificationManager, self).get_queryset()
+                         .filter(recipient_id__in=missing, read=False)
+                         .order_by().values_list('recipient')
+                         .annotate(models.Count('id')))
+            cache.set_many(
+                dict((_unread_cache_key(user_id), count)
+                     for user_id, count in fresh.items()),
+                NOTIFICATIONS_UNREAD_TIMEOUT)
+            counts.update(fresh)
+        return counts
+
+    def incr_unread(self, user_ids):
+        """
+        Adds one to the cached unread count of each user id, once per
+        occurrence. Counts that aren't cached are left to be computed on
+        the next read.
+        """
+        for user_id in user_ids:
+            try:
+                cache.incr(_unread_cache_key(user_id))
+            except ValueError:
+                pass
+
+    def forget_unread(self, user_ids):
+        """
+        Drops the cached unread counts of the user ids so that they are
+        recomputed on the next read.
+        """
+        cache.delete_many([_unread_cache_key(user_id)
+                           for user_id in user_ids])
+
+    def mark_all_read(self, user, up_to=None):
+        """
+        Marks the user's unread notifications as read, only those with
+        an id up to and including up_to when given. Returns the number of
+        notifications marked.
+        """
+        notifications = super(NotificationManager, self).get_queryset() \
+            .filter(recipient=user, read=False)
+        if up_to is not None:
+            notifications = notifications.filter(id__lte=up_to)
+        updated = notifications.update(read=True)
+        # Setting the count to 0 would lose notifications created since
+        # the update, so it is recomputed instead.
+        self.forget_unread([user.pk])
+        return updated
 
 
 @python_2_unicode_compatible
@@ -77,6 +154,10 @@ class Notification(TimeStampedModel):
     class Meta:
         ordering = ['-created']
         app_label = 'notifications'
+        index_together = [
+            ('recipient', 'created', 'id'),
+            ('recipient', 'read', 'created', 'id'),
+        ]
 
     def __str__(self):
         context = {
@@ -93,3 +174,81 @@ class Notification(TimeStampedModel):
                 return "%(verb)s %(action)s" % context
             return "%(verb)s" % context
         return "%(verb)s" % context
+
+
+class PushMessageManager(models.Manager):
+    def queue(self, recipients, message, sound='default'):
+        """
+        Queues a push notification for each recipient. The messages are
+        delivered in batches by the send_pushes management command.
+        """
+        return self.bulk_create([
+            PushMessage(recipient=recipient, message=message, sound=sound)
+            for recipient in recipients])
+
+    def pending(self):
+        """
+        Returns the messages that are due to be sent, oldest first.
+        Messages claimed by a worker that hasn't reported back within
+        PUSH_CLAIM_TIMEOUT seconds are due again.
+        """
+        now = timezone.now()
+        stale = now - timedelta(seconds=PUSH_CLAIM_TIMEOUT)
+        return self.filter(
+            models.Q(status=PushMessage.PENDING, next_attempt_at__lte=now) |
+            models.Q(status=PushMessage.SENDING, modified__lt=stale)
+        ).order_by('next_attempt_at', 'id')
+
+    def claim(self, batch_size):
+        """
+        Marks up to batch_size pending messages as being sent and returns
+        their (id, recipient_id, message, sound, platforms, attempts),
+        platforms being the ones still to send to. The row locks are only
+        held while claiming, so the messages can be sent outside of any
+        transaction without other workers picking them up.
+        """
+        with transaction.atomic():
+            batch = list(self.pending().select_for_update().values_list(
+                'id', 'recipient_id', 'message', 'sound', 'platforms',
+                'attempts')[:batch_size])
+            self.filter(id__in=[row[0] for row in batch]).update(
+                status=PushMessage.SENDING, modified=timezone.now())
+        return batch
+
+
+@python_2_unicode_compatible
+class PushMessage(TimeStampedModel):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL,
+                                  related_name='push_messages')
+    message = models.CharField(max_length=255)
+    sound = models.CharField(max_length=50, blank=True, default='default')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=PENDING)
+    # Comma separated platforms ("apns,gcm,wns") not delivered to yet, so
+    # a retry skips the ones that already succeeded.
+    platforms = models.CharField(max_length=20, blank=True,
+                                 default='apns,gcm,wns')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True)
+
+    objects = PushMessageManager()
+
+    class Meta:
+        ordering = ['created']
+        app_label = 'notifications'
+        index_together = [('status', 'next_attempt_at')]
+
+    def __str__(self):
+        return self.message
@@ -1,54 +1,56 @@
-from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
+from django.db.models import Max
 from django.dispatch import Signal
 
+from core.utils import generic_relation_fields
 from .models import Notification
 
 
+NOTIFICATIONS_BATCH_SIZE = getattr(settings, 'NOTIFICATIONS_BATCH_SIZE', 500)
+
+
 notify = Signal(
-    providing_args=['recipient', 'verb', 'action', 'target', 'affected_users']
+    providing_args=['recipient', 'verb', 'action', 'target', 'affected_users',
+                    'batch_size']
 )
 
 
 def new_notification(sender, **kwargs):
+    """
+    Creates the notification for the recipient, or one notification per
+    user in affected_users written with bulk inserts of batch_size rows.
+
+    Returns the created notifications, with their ids set so that push
+    delivery can follow. The recipients' cached unread counts are
+    incremented.
+    """
     kwargs.pop('signal', None)
     affected_users = kwargs.pop('affected_users', None)
-    recipient = kwargs.pop("recipient")
+    recipient = kwargs.pop("recipient", None)
     verb = kwargs.pop("verb")
-
-    if recipient != sender:
-        if affected_users is not None:
-            for user in affected_users:
-                new_note = Notification(
-                    recipient=user,
-                    verb=verb,
-                    sender_content_type=ContentType.objects.get_for_model(sender),
-                    sender_object_id=sender.id,
-                )
-                for option in ("target", "action"):
-                    try:
-                        obj = kwargs[option]
-                        if obj is not None:
-                            setattr(new_note, "{}_content_type".format(option),
-                                    ContentType.objects.get_for_model(obj))
-                            setattr(new_note, "{}_object_id".format(option),
-                                    obj.id)
-                    except StandardError:
-                        pass
-                new_note.save()
-        else:
-            new_note = Notification(
-                recipient=recipient,
-                verb=verb,
-                sender_content_type=ContentType.objects.get_for_model(sender),
-                sender_object_id=sender.id,
-            )
-            for option in ("target", "action"):
-                obj = kwargs.pop(option, None)
-                if obj is not None:
-                    setattr(new_note, "{}_content_type".format(option),
-                            ContentType.objects.get_for_model(obj))
-                    setattr(new_note, "{}_object_id".format(option), obj.id)
-            new_note.save()
+    batch_size = kwargs.pop('batch_size', NOTIFICATIONS_BATCH_SIZE)
+    fields = generic_relation_fields(sender, target=kwargs.get("target"),
+                                     action=kwargs.get("action"))
+
+    if affected_users is not None:
+        last_id = Notification.objects.aggregate(
+            last_id=Max('id'))['last_id'] or 0
+        notes = [Notification(recipient=user, verb=verb, **fields)
+                 for user in affected_users if user != sender]
+        notes = Notification.objects.bulk_create(notes, batch_size=batch_size)
+        if not all(note.pk for note in notes):
+            # Only some backends (PostgreSQL) return ids from bulk
+            # inserts.
+            notes = list(Notification.objects.filter(
+                id__gt=last_id, verb=verb, **fields).order_by('id'))
+        Notification.objects.incr_unread(note.recipient_id for note in notes)
+        return notes
+    elif recipient != sender:
+        new_note = Notification(recipient=recipient, verb=verb, **fields)
+        new_note.save()
+        Notification.objects.incr_unread([new_note.recipient_id])
+        return [new_note]
+    return []
 
 
 notify.connect(new_notification)
@@ -1,3 +1,281 @@
+from datetime import datetime, timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.utils.six import StringIO
+from rest_framework.test import APIClient
+
+from accounts.models import MyUser
+from api.pagination import NotificationCursorPagination
+from notifications.models import Notification, PushMessage
+from notifications.signals import notify
+from push_notifications.models import APNSDevice
+
+
+def make_user(email, full_name='Test User', password='abc1234'):
+    return MyUser.objects.create_user(email=email, full_name=full_name,
+                                      password=password)
+
+
+class NotifyTest(TestCase):
+    def setUp(self):
+        self.sender = make_user('sender@test.com')
+        self.guests = [make_user('guest{}@test.com'.format(i))
+                       for i in range(5)]
+
+    def test_single_recipient(self):
+        notify.send(self.sender, recipient=self.guests[0],
+                    verb='is now following you.')
+        note = Notification.objects.get()
+        self.assertEqual(note.recipient, self.guests[0])
+        self.assertEqual(note.sender_object, self.sender)
+
+    def test_no_notification_to_self(self):
+        notify.send(self.sender, recipient=self.sender,
+                    verb='is now following you.')
+        self.assertFalse(Notification.objects.exists())
+
+    def test_affected_users_bulk_created(self):
+        ContentType.objects.clear_cache()
+        # One content type lookup, one INSERT per batch of two, and on
+        # SQLite the queries finding the new ids.
+        with self.assertNumQueries(6):
+            responses = notify.send(
+                self.sender, affected_users=self.guests + [self.sender],
+                verb='has invited you to an event.', target=self.guests[0],
+                batch_size=2)
+        created = responses[0][1]
+        self.assertEqual(len(created), 5)
+        self.assertEqual(
+            sorted(note.pk for note in created),
+            sorted(Notification.objects.values_list('id', flat=True)))
+        self.assertEqual(
+            set(Notification.objects.values_list('recipient_id', flat=True)),
+            set(guest.id for guest in self.guests))
+        self.assertEqual(
+            Notification.objects.filter(
+                target_object_id=self.guests[0].id).count(), 5)
+
+
+class NotificationAPIQueryCountTest(TestCase):
+    def setUp(self):
+        self.recipient = make_user('recipient@test.com')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.recipient)
+        self.url = reverse('notification_list_api')
+        cache.clear()
+
+    def add_notifications(self, count):
+        for i in range(count):
+            sender = make_user('sender{}@test.com'.format(
+                Notification.objects.count()))
+            notify.send(sender, recipient=self.recipient,
+                        verb='has invited you to an event.', target=sender,
+                        action=sender)
+
+    def test_page_cost_is_constant(self):
+        self.add_notifications(2)
+        # The rows and one query each for senders, actions and targets.
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.add_notifications(10)
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_cursor_pages(self):
+        self.add_notifications(12)
+        expected = list(Notification.objects.filter(
+            recipient=self.recipient).order_by('-created', '-id')
+            .values_list('id', flat=True))
+
+        response = self.client.get(self.url, {'limit': 5, 'count': 'true'})
+        self.assertEqual(response.data['count'], 12)
+        self.assertIsNone(response.data['previous'])
+        seen = [n['id'] for n in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            self.assertNotIn('count', response.data)
+            seen += [n['id'] for n in response.data['results']]
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([n['id'] for n in response.data['results']],
+                         expected[5:10])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([n['id'] for n in response.data['results']],
+                         expected[:5])
+        self.assertIsNone(response.data['previous'])
+
+    def test_keyset_filter_bounds_the_leading_column(self):
+        # So the (recipient, created, id) index is range scanned
+        keyset = NotificationCursorPagination().get_keyset_filter(
+            ('-created', '-id'), [datetime(2017, 1, 1), 10])
+        sql = str(Notification.objects.filter(keyset).query)
+        self.assertIn('"created" <= 2017-01-01', sql)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'nonsense'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_listing_has_no_side_effects(self):
+        self.add_notifications(3)
+        self.client.get(self.url)
+        self.assertEqual(
+            Notification.objects.unread_for_user(self.recipient).count(), 3)
+
+
+class NotificationMarkReadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sender = make_user('sender@test.com')
+        self.recipient = make_user('recipient@test.com')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.recipient)
+        self.url = reverse('notification_mark_read_api')
+        self.notes = [notify.send(self.sender, recipient=self.recipient,
+                                  verb='is now following you.')[0][1][0]
+                      for i in range(3)]
+
+    def test_marks_up_to_watermark(self):
+        response = self.client.post(self.url, {'up_to': self.notes[1].pk})
+        self.assertEqual(response.data, {'marked': 2, 'unread_count': 1})
+        response = self.client.post(self.url, {'up_to': self.notes[1].pk})
+        self.assertEqual(response.data, {'marked': 0, 'unread_count': 1})
+
+    def test_marks_everything_without_watermark(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.data, {'marked': 3, 'unread_count': 0})
+
+    def test_rejects_invalid_watermark(self):
+        response = self.client.post(self.url, {'up_to': 'latest'})
+        self.assertEqual(response.status_code, 400)
+
+
+class PruneNotificationsTest(TestCase):
+    def test_keeps_newest_per_user(self):
+        sender = make_user('sender@test.com')
+        recipients = [make_user('guest{}@test.com'.format(i))
+                      for i in range(2)]
+        for i in range(5):
+            notify.send(sender, recipient=recipients[0],
+                        verb='is now following you.')
+        notify.send(sender, recipient=recipients[1],
+                    verb='is now following you.')
+        newest = list(Notification.objects.all_for_user(recipients[0])
+                      .order_by('-created', '-id')[:2])
+        out = StringIO()
+        call_command('prune_notifications', keep=2, chunk_size=2, stdout=out)
+        self.assertIn('deleted 3 notifications of 1 users', out.getvalue())
+        self.assertEqual(
+            list(Notification.objects.all_for_user(recipients[0])
+                 .order_by('-created', '-id')), newest)
+        self.assertEqual(
+            Notification.objects.all_for_user(recipients[1]).count(), 1)
+
+
+class PushOutboxTest(TestCase):
+    def setUp(self):
+        self.sender = make_user('sender@test.com')
+        self.guests = [make_user('guest{}@test.com'.format(i))
+                       for i in range(3)]
+
+    def test_follow_queues_push_instead_of_sending(self):
+        client = APIClient()
+        client.force_authenticate(user=self.sender)
+        APNSDevice.objects.create(user=self.guests[0], registration_id='ab')
+        url = reverse('follow_status_api',
+                      kwargs={'user_pk': self.guests[0].pk})
+        response = client.post(url)
+        self.assertEqual(response.status_code, 200)
+        message = PushMessage.objects.get()
+        self.assertEqual(message.recipient, self.guests[0])
+        self.assertEqual(message.status, PushMessage.PENDING)
+        self.assertEqual(message.message,
+                         '{} is now following you.'.format(self.sender))
+
+    def test_send_pushes_marks_batch_sent(self):
+        PushMessage.objects.queue(self.guests, 'hello')
+        PushMessage.objects.queue(self.guests[:1], 'bye')
+        out = StringIO()
+        call_command('send_pushes', stdout=out)
+        self.assertIn('sent 4 messages, 0 failed', out.getvalue())
+        self.assertFalse(PushMessage.objects.pending().exists())
+
+    def test_claimed_messages_are_not_pending(self):
+        PushMessage.objects.queue(self.guests, 'hello')
+        claimed = PushMessage.objects.claim(2)
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(
+            PushMessage.objects.filter(status=PushMessage.SENDING).count(), 2)
+        self.assertEqual(PushMessage.objects.pending().count(), 1)
+
+        # A worker that died while sending gives its messages back
+        PushMessage.objects.filter(status=PushMessage.SENDING).update(
+            modified=datetime.now() - timedelta(hours=1))
+        self.assertEqual(PushMessage.objects.pending().count(), 3)
+
+    def test_send_pushes_gives_up_after_max_attempts(self):
+        APNSDevice.objects.create(user=self.guests[0], registration_id='ab')
+        PushMessage.objects.queue(self.guests[:1], 'hello')
+        out = StringIO()
+        call_command('send_pushes', max_attempts=2, stdout=out)
+        self.assertIn('sent 0 messages, 1 failed', out.getvalue())
+        message = PushMessage.objects.get()
+        self.assertEqual(message.status, PushMessage.PENDING)
+        # Only the failed platform is retried, and not right away
+        self.assertEqual(message.platforms, 'apns')
+        self.assertGreater(message.next_attempt_at, datetime.now())
+        self.assertFalse(PushMessage.objects.pending().exists())
+
+        PushMessage.objects.update(next_attempt_at=datetime.now())
+        call_command('send_pushes', max_attempts=2, stdout=out)
+        message = PushMessage.objects.get()
+        self.assertEqual(message.status, PushMessage.FAILED)
+        self.assertEqual(message.attempts, 2)
+        self.assertTrue(message.error.startswith('apns: '))
+
+
+class UnreadCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sender = make_user('sender@test.com')
+        self.guests = [make_user('guest{}@test.com'.format(i))
+                       for i in range(3)]
+
+    def test_count_cached_and_incremented(self):
+        notify.send(self.sender, recipient=self.guests[0],
+                    verb='is now following you.')
+        self.assertEqual(Notification.objects.unread_count(self.guests[0]), 1)
+        notify.send(self.sender, affected_users=self.guests,
+                    verb='has invited you to an event.')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                Notification.objects.unread_count(self.guests[0]), 2)
+
+    def test_missing_counts_computed_in_one_query(self):
+        notify.send(self.sender, affected_users=self.guests[:2],
+                    verb='has invited you to an event.')
+        cache.clear()
+        ids = [guest.pk for guest in self.guests]
+        with self.assertNumQueries(1):
+            counts = Notification.objects.unread_counts(ids)
+        self.assertEqual(counts, dict(zip(ids, [1, 1, 0])))
 
-# Create your tests here.
+    def test_mark_all_read_resets_count(self):
+        notify.send(self.sender, recipient=self.guests[0],
+                    verb='is now following you.')
+        Notification.objects.mark_all_read(self.guests[0])
+        # Recomputed once, so notifications created meanwhile still count
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                Notification.objects.unread_count(self.guests[0]), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                Notification.objects.unread_count(self.guests[0]), 0)
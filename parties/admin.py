@@ -18,15 +18,21 @@ class PartyAdmin(admin.ModelAdmin):
             {'fields': ('id', 'party_type', 'invite_type', 'name', 'location',
                         'latitude', 'longitude', 'party_size', 'party_month',
                         'party_day', 'party_year', 'start_time', 'end_time',
+                        'starts_at', 'ends_at',
                         'description', 'image', 'user', 'attendees',
                         'requesters', 'invited_users', 'likers',
                         'recurrence',)}),
+        (_('Counts'),
+            {'fields': ('num_attendees', 'num_requesters', 'num_invited',
+                        'num_likers',)}),
         (_('Permissions'),
             {'fields': ('is_active',)}),
         (_('Dates'),
             {'fields': ('created', 'modified',)}),
     )
-    readonly_fields = ('id', 'created', 'modified',)
+    readonly_fields = ('id', 'starts_at', 'ends_at', 'num_attendees',
+                       'num_requesters', 'num_invited', 'num_likers',
+                       'created', 'modified',)
     search_fields = ('name', 'user__full_name',)
     actions = ('enable', 'disable',)
 
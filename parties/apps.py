@@ -5,3 +5,6 @@ from django.apps import AppConfig
 
 class PartiesConfig(AppConfig):
     name = 'parties'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from parties.models import Party
+
+
+class Command(BaseCommand):
+    help = ('Deactivates every party that has ended. Meant to run '
+            'periodically, e.g. from a scheduler.')
+
+    def handle(self, *args, **options):
+        count = Party.objects.deactivate_expired()
+        self.stdout.write('deactivated %d parties' % count)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from parties.models import Party
+
+
+class Command(BaseCommand):
+    help = ('Repairs drift between the party counter columns and their '
+            'attendee, requester, invited user and liker relations')
+
+    def handle(self, *args, **options):
+        repaired = 0
+        for field_name, counter in Party.COUNTER_FIELDS:
+            counts = Party.objects.annotate(total=Count(field_name)) \
+                .values_list('id', counter, 'total')
+            for party_id, stored, total in counts.iterator():
+                if stored != total:
+                    Party.objects.filter(id=party_id).update(
+                        modified=timezone.now(), **{counter: total})
+                    repaired += 1
+        self.stdout.write('repaired %d counters' % repaired)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+COUNTER_FIELDS = (
+    ('attendees', 'num_attendees'),
+    ('requesters', 'num_requesters'),
+    ('invited_users', 'num_invited'),
+    ('likers', 'num_likers'),
+)
+
+
+def populate_counters(apps, schema_editor):
+    Party = apps.get_model('parties', 'Party')
+    for field_name, counter in COUNTER_FIELDS:
+        counts = Party.objects.annotate(total=Count(field_name)).filter(
+            total__gt=0).values_list('id', 'total')
+        for party_id, total in counts:
+            Party.objects.filter(id=party_id).update(**{counter: total})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parties', '0003_party_recurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='party',
+            name='num_attendees',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='party',
+            name='num_invited',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='party',
+            name='num_likers',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='party',
+            name='num_requesters',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
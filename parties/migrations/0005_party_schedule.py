@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 09:16
+from __future__ import unicode_literals
+
+from datetime import date, datetime, timedelta
+
+from django.db import migrations, models
+
+
+def populate_schedule(apps, schema_editor):
+    Party = apps.get_model('parties', 'Party')
+    for party in Party.objects.all().iterator():
+        party_date = date(party.party_year, party.party_month,
+                          party.party_day)
+        starts_at = datetime.combine(party_date, party.start_time)
+        if party.end_time is None:
+            ends_at = datetime.combine(party_date + timedelta(days=1),
+                                       datetime.min.time())
+        else:
+            ends_at = datetime.combine(party_date, party.end_time)
+            if party.end_time < party.start_time:
+                ends_at += timedelta(days=1)
+        Party.objects.filter(pk=party.pk).update(starts_at=starts_at,
+                                                 ends_at=ends_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parties', '0004_party_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='party',
+            name='ends_at',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='party',
+            name='starts_at',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='party',
+            index_together=set([('is_active', 'starts_at')]),
+        ),
+        migrations.RunPython(populate_schedule, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-18 09:58
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parties', '0005_party_schedule'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='party',
+            index_together=set([('is_active', 'starts_at', 'id')]),
+        ),
+    ]
@@ -1,6 +1,6 @@
 from __future__ import unicode_literals
 
-from datetime import date
+from datetime import date, datetime, timedelta
 
 from django.conf import settings
 from django.core.validators import MaxValueValidator
@@ -19,39 +19,58 @@ def party_image_upload_loc(instance, filename):
     return "party_images/{}".format(filename)
 
 
+class PartyQuerySet(models.query.QuerySet):
+    def visible_to(self, viewer):
+        """
+        Returns the parties the viewer may see: invite only parties are
+        hidden unless the viewer is hosting, attending or invited.
+        """
+        attending = Party.attendees.through.objects.filter(
+            myuser_id=viewer.pk).values('party_id')
+        invited = Party.invited_users.through.objects.filter(
+            myuser_id=viewer.pk).values('party_id')
+        return self.filter(
+            ~models.Q(invite_type=Party.INVITE_ONLY) |
+            models.Q(user_id=viewer.pk) |
+            models.Q(pk__in=attending) |
+            models.Q(pk__in=invited)
+        )
+
+    def expired(self, now=None):
+        """Returns the active parties that have already ended."""
+        return self.filter(is_active=True,
+                           ends_at__lte=now or datetime.now())
+
+
 class PartyManager(models.Manager):
+    def get_queryset(self):
+        return PartyQuerySet(self.model, using=self._db)
+
     def active(self):
         """Returns all active parties."""
-        return super(PartyManager, self).get_queryset() \
-            .filter(is_active=True)
+        return self.get_queryset().filter(is_active=True)
+
+    def deactivate_expired(self, now=None):
+        """
+        Deactivates every party that has ended with a single UPDATE and
+        returns how many were deactivated.
+        """
+        return self.get_queryset().expired(now=now).update(is_active=False)
 
     def own_parties_hosting(self, user, viewing_user):
-        """Returns all of the parties the user is/has hosted."""
-        qs = super(PartyManager, self).get_queryset().filter(user=user)
-
-        to_remove_ids = []
-
-        for party in qs:
-            # viewing user cannot be the party creator
-            # party must be invite only
-            # viewing user cannot be attending the party
-            # viewing user cannot be already invited
-            # if any fail, show the party
-            # if they all pass, hide the party
-            if (viewing_user != party.user and
-                party.invite_type == Party.INVITE_ONLY and
-                not party.attendees.filter(id=viewing_user.id).exists() and
-                not party.invited_users.filter(id=viewing_user.id).exists()):
-
-                to_remove_ids.append(party.id)
-        return qs.exclude(id__in=to_remove_ids).order_by(
-            '-is_active', 'party_year', 'party_month', 'party_day',
-            '-start_time'
-        )
+        """
+        Returns all of the parties the user is/has hosted that the
+        viewing user may see.
+        """
+        return self.get_queryset().filter(user=user).visible_to(
+            viewing_user).order_by(
+                '-is_active', 'party_year', 'party_month', 'party_day',
+                '-start_time'
+            )
 
     def own_parties_attending(self, user):
         """Returns all of the parties the user is attending."""
-        return super(PartyManager, self).get_queryset().filter(attendees=user)
+        return self.get_queryset().filter(attendees=user)
 
     def party_create(self, user, party_type, invite_type, name, location,
                      party_size, party_month, party_day, start_time,
@@ -78,6 +97,7 @@ class PartyManager(models.Manager):
         party = self.model(
             user=user,
             party_type=party_type,
+            invite_type=invite_type,
             name=name,
             location=location,
             party_size=party_size,
@@ -159,6 +179,10 @@ class Party(TimeStampedModel):
     party_year = models.PositiveIntegerField(default=date.today().year)
     start_time = models.TimeField(verbose_name='Start Time')
     end_time = models.TimeField(verbose_name='End Time', blank=True, null=True)
+    # Computed from the fields above on save so date filtering and
+    # ordering can use range scans.
+    starts_at = models.DateTimeField(null=True, editable=False, db_index=True)
+    ends_at = models.DateTimeField(null=True, editable=False, db_index=True)
     description = models.TextField(max_length=500, blank=True)
     image = models.ImageField(_('party image'), blank=True,
                               upload_to=party_image_upload_loc)
@@ -178,19 +202,73 @@ class Party(TimeStampedModel):
                                     related_name='likers',
                                     blank=True)
 
+    # Maintained by parties.signals; repaired by reconcile_party_counts.
+    num_attendees = models.PositiveIntegerField(default=0)
+    num_requesters = models.PositiveIntegerField(default=0)
+    num_invited = models.PositiveIntegerField(default=0)
+    num_likers = models.PositiveIntegerField(default=0)
+
     is_active = models.BooleanField(_('active'), default=True)
 
     objects = PartyManager()
 
+    # Maps each many to many field to the column counting its rows.
+    COUNTER_FIELDS = (
+        ('attendees', 'num_attendees'),
+        ('requesters', 'num_requesters'),
+        ('invited_users', 'num_invited'),
+        ('likers', 'num_likers'),
+    )
+
     class Meta:
         app_label = 'parties'
         verbose_name = _('party')
         verbose_name_plural = _('parties')
         ordering = ['-created']
+        index_together = [('is_active', 'starts_at', 'id')]
+
+    SCHEDULE_FIELDS = ('party_year', 'party_month', 'party_day', 'start_time',
+                       'end_time')
 
     def __str__(self):
         return str(self.user.get_full_name)
 
+    def save(self, *args, **kwargs):
+        self.starts_at, self.ends_at = self.get_schedule()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and \
+                set(update_fields) & set(self.SCHEDULE_FIELDS):
+            kwargs['update_fields'] = list(update_fields) + ['starts_at',
+                                                             'ends_at']
+        return super(Party, self).save(*args, **kwargs)
+
+    @property
+    def has_ended(self):
+        """Returns whether the party's end time has passed."""
+        return self.ends_at is not None and self.ends_at <= datetime.now()
+
+    def get_schedule(self):
+        """
+        Returns the datetimes the party starts and ends at. A party
+        ending before its start time ends the following day, and one
+        without an end time lasts until the end of its day.
+        """
+        party_date = date(int(self.party_year), int(self.party_month),
+                          int(self.party_day))
+        start_time = self._meta.get_field('start_time').to_python(
+            self.start_time)
+        end_time = self._meta.get_field('end_time').to_python(self.end_time)
+
+        starts_at = datetime.combine(party_date, start_time)
+        if end_time is None:
+            ends_at = datetime.combine(party_date + timedelta(days=1),
+                                       datetime.min.time())
+        else:
+            ends_at = datetime.combine(party_date, end_time)
+            if end_time < start_time:
+                ends_at += timedelta(days=1)
+        return starts_at, ends_at
+
     @cached_property
     def get_attendees_info(self):
         """Returns the information for each attendee of the party."""
@@ -214,9 +292,19 @@ class Party(TimeStampedModel):
     @property
     def attendees_count(self):
         """Returns the number of attendees of the party."""
-        return str(self.get_attendees_info.count())
+        return str(self.num_attendees)
 
     @property
     def requesters_count(self):
         """Returns the number of requesters of the party."""
-        return str(self.get_requesters_info.count())
+        return str(self.num_requesters)
+
+    @property
+    def invited_users_count(self):
+        """Returns the number of users invited to the party."""
+        return str(self.num_invited)
+
+    @property
+    def likers_count(self):
+        """Returns the number of likers of the party."""
+        return str(self.num_likers)
@@ -0,0 +1,66 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed
+from django.utils import timezone
+
+from .models import Party
+
+
+def update_party_counter(field_name, counter):
+    """
+    Returns an m2m_changed receiver keeping the party's counter column
+    in step with its field_name relation, from either side of it. The
+    party's modified time is bumped as well, since it keys the cached
+    serialized party.
+    """
+    through = getattr(Party, field_name).through
+    field = Party._meta.get_field(field_name)
+    party_column = '{}_id'.format(field.m2m_field_name())
+    user_column = '{}_id'.format(field.m2m_reverse_field_name())
+
+    def receiver(sender, instance, action, reverse, pk_set, **kwargs):
+        if action == 'post_add':
+            if not pk_set:
+                return
+            now = timezone.now()
+            if reverse:
+                Party.objects.filter(pk__in=pk_set).update(
+                    modified=now, **{counter: F(counter) + 1})
+            else:
+                Party.objects.filter(pk=instance.pk).update(
+                    modified=now, **{counter: F(counter) + len(pk_set)})
+                setattr(instance, counter,
+                        getattr(instance, counter) + len(pk_set))
+                instance.modified = now
+        elif action in ('pre_remove', 'pre_clear'):
+            # remove() reports every pk it was given, so count the rows
+            # that actually go away before they are deleted.
+            if reverse:
+                rows = through.objects.filter(**{user_column: instance.pk})
+                if action == 'pre_remove':
+                    rows = rows.filter(**{'{}__in'.format(party_column):
+                                          pk_set})
+                Party.objects.filter(
+                    pk__in=list(rows.values_list(party_column, flat=True))
+                ).update(modified=timezone.now(),
+                         **{counter: F(counter) - 1})
+            else:
+                rows = through.objects.filter(**{party_column: instance.pk})
+                if action == 'pre_remove':
+                    rows = rows.filter(**{'{}__in'.format(user_column):
+                                          pk_set})
+                removed = rows.count()
+                if removed:
+                    now = timezone.now()
+                    Party.objects.filter(pk=instance.pk).update(
+                        modified=now, **{counter: F(counter) - removed})
+                    setattr(instance, counter,
+                            getattr(instance, counter) - removed)
+                    instance.modified = now
+
+    m2m_changed.connect(receiver, sender=through, weak=False,
+                        dispatch_uid='party_counter_{}'.format(field_name))
+    return receiver
+
+
+for field_name, counter in Party.COUNTER_FIELDS:
+    update_party_counter(field_name, counter)
@@ -1,5 +1,12 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.six import StringIO
+from rest_framework.test import APIClient
 
 from accounts.models import MyUser
 from parties.models import Party
@@ -10,23 +17,252 @@ def make_user(email='user@test.com', full_name='Test User', password='abc1234'):
                                       password=password)
 
 
+def make_party(user, invite_type=Party.OPEN, **extra_fields):
+    return Party.objects.party_create(
+        user=user,
+        party_type=Party.SOCIAL,
+        invite_type=invite_type,
+        name='name of party',
+        location='1 Oak NYC',
+        party_size=Party.SMALL,
+        party_month=8,
+        party_day=25,
+        start_time=datetime.now(),
+        recurrence=Party.NONE,
+        end_time=datetime.now() + timedelta(hours=3),
+        description='An an valley indeed so no wonder future nature vanity. '
+                    'Debating all she mistaken indulged believed provided declared.',
+        **extra_fields)
+
+
 class PartyCreateUnitTest(TestCase):
     def setUp(self):
         user = make_user()
-        Party.objects.party_create(
-            user=user,
-            party_type=Party.SOCIAL,
-            name='name of party',
-            location='1 Oak NYC',
-            party_size=Party.SMALL,
-            party_month=8,
-            party_day=25,
-            start_time=datetime.now(),
-            end_time=datetime.now() + timedelta(hours=3),
-            description='An an valley indeed so no wonder future nature vanity. '
-                        'Debating all she mistaken indulged believed provided declared.',)
+        make_party(user)
 
     def test_party_created(self):
         party = Party.objects.get(name='name of party')
         self.assertEqual(party.name, 'name of party', "Party name "
             "should be: name of party. Instead was: {}".format(party.name))
+
+
+class PartyCounterTest(TestCase):
+    def setUp(self):
+        self.host = make_user()
+        self.guests = [make_user('guest{}@test.com'.format(i))
+                       for i in range(3)]
+        self.party = make_party(self.host)
+
+    def assertCounts(self, **counts):
+        party = Party.objects.get(pk=self.party.pk)
+        for counter, value in counts.items():
+            self.assertEqual(getattr(party, counter), value)
+            self.assertEqual(getattr(self.party, counter), value)
+
+    def test_creator_counted_as_attendee(self):
+        self.assertCounts(num_attendees=1)
+        self.assertEqual(self.party.attendees_count, '1')
+
+    def test_add_and_remove(self):
+        self.party.likers.add(*self.guests)
+        self.party.likers.add(self.guests[0])
+        self.assertCounts(num_likers=3)
+
+        self.party.likers.remove(self.guests[0], self.host)
+        self.assertCounts(num_likers=2)
+
+        self.party.likers.clear()
+        self.assertCounts(num_likers=0)
+
+    def test_reverse_side(self):
+        guest = self.guests[0]
+        guest.party_requesters.add(self.party)
+        self.assertEqual(
+            Party.objects.get(pk=self.party.pk).num_requesters, 1)
+
+        guest.party_requesters.remove(self.party)
+        guest.party_requesters.remove(self.party)
+        self.assertEqual(
+            Party.objects.get(pk=self.party.pk).num_requesters, 0)
+
+    def test_reconcile_command(self):
+        self.party.invited_users.add(*self.guests)
+        Party.objects.filter(pk=self.party.pk).update(num_invited=7,
+                                                      num_attendees=0)
+        out = StringIO()
+        call_command('reconcile_party_counts', stdout=out)
+        self.assertIn('repaired 2 counters', out.getvalue())
+        party = Party.objects.get(pk=self.party.pk)
+        self.assertEqual(party.num_invited, 3)
+        self.assertEqual(party.num_attendees, 1)
+
+
+class PartyVisibilityTest(TestCase):
+    def setUp(self):
+        self.host = make_user()
+        self.guest = make_user('guest@test.com')
+        self.viewer = make_user('viewer@test.com')
+        self.open_party = make_party(self.host)
+        self.private_party = make_party(self.host,
+                                        invite_type=Party.INVITE_ONLY)
+
+    def visible_ids(self, viewer):
+        return set(Party.objects.own_parties_hosting(
+            user=self.host, viewing_user=viewer).values_list('id', flat=True))
+
+    def test_invite_only_hidden_from_strangers(self):
+        self.assertEqual(self.visible_ids(self.viewer), {self.open_party.id})
+
+    def test_invite_only_visible_to_host_guests_and_attendees(self):
+        everything = {self.open_party.id, self.private_party.id}
+        self.assertEqual(self.visible_ids(self.host), everything)
+
+        self.private_party.invited_users.add(self.guest)
+        self.assertEqual(self.visible_ids(self.guest), everything)
+
+        self.private_party.attendees.add(self.viewer)
+        self.assertEqual(self.visible_ids(self.viewer), everything)
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            list(Party.objects.all().visible_to(self.viewer))
+
+
+class PartyScheduleTest(TestCase):
+    def setUp(self):
+        self.host = make_user()
+
+    def test_schedule_from_strings(self):
+        party = Party.objects.create(
+            user=self.host, name='late night', location='1 Oak NYC',
+            party_year='2017', party_month='08', party_day='25',
+            start_time='22:00', end_time='02:30')
+        party = Party.objects.get(pk=party.pk)
+        self.assertEqual(party.starts_at, datetime(2017, 8, 25, 22, 0))
+        self.assertEqual(party.ends_at, datetime(2017, 8, 26, 2, 30))
+
+    def test_without_end_time_lasts_the_day(self):
+        party = Party.objects.create(
+            user=self.host, name='all day', location='1 Oak NYC',
+            party_year=2017, party_month=8, party_day=25,
+            start_time=time(12, 0))
+        self.assertEqual(party.ends_at, datetime(2017, 8, 26, 0, 0))
+
+    def test_update_fields_recomputes_schedule(self):
+        party = make_party(self.host)
+        party.party_day = 26
+        party.save(update_fields=['party_day'])
+        self.assertEqual(Party.objects.get(pk=party.pk).starts_at.day, 26)
+
+
+class PartyListAPITest(TestCase):
+    def setUp(self):
+        self.host = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.host)
+        cache.clear()
+
+    def create_party(self, day, **extra_fields):
+        return Party.objects.create(
+            user=self.host, name='party', location='1 Oak NYC',
+            party_year=day.year, party_month=day.month, party_day=day.day,
+            start_time=time(20, 0), **extra_fields)
+
+    def test_list_filters_and_orders_in_sql(self):
+        today = date.today()
+        later = self.create_party(today + timedelta(days=3))
+        sooner = self.create_party(today)
+        recurring_today = self.create_party(today, recurrence=Party.WEEKLY)
+        self.create_party(today + timedelta(days=7), recurrence=Party.WEEKLY)
+        self.create_party(today, invite_type=Party.INVITE_ONLY)
+
+        response = self.client.get(reverse('party_list_api'))
+        self.assertEqual([party['id'] for party in response.data['results']],
+                         [sooner.id, recurring_today.id, later.id])
+
+    def test_list_renders_cached_parties(self):
+        today = date.today()
+        parties = [self.create_party(today + timedelta(days=i))
+                   for i in range(3)]
+        url = reverse('party_list_api')
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        # Only the page itself is queried once the parties are cached
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(url)
+        self.assertLess(len(second), len(first))
+        self.assertEqual([party['likers_count']
+                          for party in response.data['results']],
+                         ['0', '0', '0'])
+
+        parties[1].likers.add(self.host)
+        response = self.client.get(url)
+        self.assertEqual([party['likers_count']
+                          for party in response.data['results']],
+                         ['0', '1', '0'])
+        self.assertEqual(response.data['results'][1]['get_likers_info'],
+                         [{'id': self.host.pk, 'full_name': 'Test User'}])
+
+        # Profile edits don't touch the party but still show up
+        self.host.full_name = 'Renamed'
+        self.host.save(update_fields=['full_name'])
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][1]['get_likers_info'],
+                         [{'id': self.host.pk, 'full_name': 'Renamed'}])
+        self.assertEqual(response.data['results'][0]['user'], 'Renamed')
+
+
+class PartyExpiryTest(TestCase):
+    def setUp(self):
+        self.host = make_user()
+        yesterday = date.today() - timedelta(days=1)
+        self.ended = Party.objects.create(
+            user=self.host, name='ended', location='1 Oak NYC',
+            party_year=yesterday.year, party_month=yesterday.month,
+            party_day=yesterday.day, start_time=time(20, 0))
+        self.upcoming = make_party(self.host, party_year=date.today().year + 1)
+
+    def test_detail_is_a_pure_read(self):
+        client = APIClient()
+        client.force_authenticate(user=self.host)
+        cache.clear()
+        url = reverse('party_detail_api', kwargs={'party_pk': self.ended.pk})
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertFalse(any(q['sql'].startswith('UPDATE')
+                             for q in ctx.captured_queries))
+        self.assertFalse(response.data['is_active'])
+        self.assertTrue(Party.objects.get(pk=self.ended.pk).is_active)
+
+    def test_expire_parties_command(self):
+        out = StringIO()
+        with self.assertNumQueries(1):
+            call_command('expire_parties', stdout=out)
+        self.assertIn('deactivated 1 parties', out.getvalue())
+        self.assertFalse(Party.objects.get(pk=self.ended.pk).is_active)
+        self.assertTrue(Party.objects.get(pk=self.upcoming.pk).is_active)
+
+
+class PartyDetailCacheTest(TestCase):
+    def setUp(self):
+        self.host = make_user()
+        self.guest = make_user(email='guest@test.com')
+        self.party = make_party(self.host, party_year=date.today().year + 1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.guest)
+        self.url = reverse('party_detail_api',
+                           kwargs={'party_pk': self.party.pk})
+        cache.clear()
+
+    def test_writes_invalidate_cached_party(self):
+        self.assertEqual(self.client.get(self.url).data['likers_count'], '0')
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        self.client.post(reverse('party_like_api',
+                                 kwargs={'party_pk': self.party.pk}))
+        self.assertEqual(self.client.get(self.url).data['likers_count'], '1')
+
+        self.client.post(reverse('party_attend_api',
+                                 kwargs={'party_pk': self.party.pk}))
+        self.assertEqual(self.client.get(self.url).data['attendees_count'], '2')
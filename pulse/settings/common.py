@@ -82,7 +82,6 @@ INSTALLED_APPS = (
 # MIDDLEWARE #
 ##############
 MIDDLEWARE_CLASSES = (
-    'django.middleware.cache.UpdateCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,7 +92,6 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.middleware.cache.FetchFromCacheMiddleware',
 )
 
 
@@ -161,6 +159,18 @@ FILE_UPLOAD_HANDLERS = (
 )
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5 MB
 
+
+#########
+# CACHE #
+#########
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+# Cache used by api.mixins.CacheMixin for API responses
+API_CACHE_ALIAS = 'default'
+
 # A P I
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
@@ -63,6 +63,7 @@ CSRF_COOKIE_SECURE = False
 
 # A P P L I C A T I O N S
 INSTALLED_APPS += (
+    'django.contrib.postgres',
     'storages',
 )
 
@@ -111,7 +112,14 @@ TEMPLATES = [
 # C A C H E
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # Serve from the database if Redis goes away
+            'IGNORE_EXCEPTIONS': True,
+        },
+        'KEY_PREFIX': 'pulse',
     }
 }
 
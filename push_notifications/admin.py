@@ -3,7 +3,7 @@ from django.contrib import admin, messages
 from django.utils.translation import ugettext_lazy as _
 from .gcm import GCMError
 from .apns import APNSServerError, APNS_ERROR_MESSAGES
-from .models import APNSDevice, GCMDevice, WNSDevice, get_expired_tokens
+from .models import APNSDevice, GCMDevice, WNSDevice, prune_expired_tokens
 from .settings import PUSH_NOTIFICATIONS_SETTINGS as SETTINGS
 
 User = apps.get_model(*SETTINGS["USER_MODEL"].split("."))
@@ -87,11 +87,7 @@ class DeviceAdmin(admin.ModelAdmin):
         # if the user doesn't select all the devices for pruning, we
         # could very easily leave an expired device as active.  Maybe
         #  this is just a bad API.
-        expired = get_expired_tokens()
-        devices = queryset.filter(registration_id__in=expired)
-        for d in devices:
-            d.active = False
-            d.save()
+        prune_expired_tokens(queryset)
 
 
 class GCMDeviceAdmin(DeviceAdmin):
@@ -5,11 +5,16 @@ https://developer.apple.com/library/ios/documentation/NetworkingInternet/Concept
 """
 
 import codecs
+import itertools
 import json
+import logging
+import select
 import ssl
 import struct
 import socket
+import threading
 import time
+from collections import defaultdict
 from contextlib import closing
 from binascii import unhexlify
 from django.core.exceptions import ImproperlyConfigured
@@ -17,6 +22,8 @@ from . import NotificationError
 from .settings import PUSH_NOTIFICATIONS_SETTINGS as SETTINGS
 
 
+logger = logging.getLogger(__name__)
+
 APNS_ERROR_MESSAGES = {
     1: "Processing error",
     2: "Missing device token",
@@ -66,7 +73,11 @@ def _check_certificate(ss):
             "The APNS certificate doesn't contain a private key")
 
 
-def _apns_create_socket(address_tuple, certfile=None):
+# certfiles that already passed _check_certificate in this process
+_checked_certificates = set()
+
+
+def _apns_get_certfile(certfile=None):
     certfile = certfile or SETTINGS.get("APNS_CERTIFICATE")
     if not certfile:
         raise ImproperlyConfigured(
@@ -74,15 +85,22 @@ def _apns_create_socket(address_tuple, certfile=None):
             'to send messages through APNS.'
         )
 
-    try:
-        with open(certfile, "r") as f:
-            content = f.read()
-    except Exception as e:
-        raise ImproperlyConfigured(
-            "The APNS certificate file at %r is not readable: %s" % (certfile, e))
+    if certfile not in _checked_certificates:
+        try:
+            with open(certfile, "r") as f:
+                content = f.read()
+        except Exception as e:
+            raise ImproperlyConfigured(
+                "The APNS certificate file at %r is not readable: %s" % (certfile, e))
+
+        _check_certificate(content)
+        _checked_certificates.add(certfile)
 
-    _check_certificate(content)
+    return certfile
 
+
+def _apns_create_socket(address_tuple, certfile=None):
+    certfile = _apns_get_certfile(certfile)
     ca_certs = SETTINGS.get("APNS_CA_CERTIFICATES")
 
     sock = socket.socket()
@@ -93,6 +111,100 @@ def _apns_create_socket(address_tuple, certfile=None):
     return sock
 
 
+class APNSConnectionPool(object):
+    """
+    Keeps idle push sockets open between sends, keyed by certfile and
+    gateway address, so that consecutive sends skip the TLS handshake.
+
+    A socket is handed to one caller at a time, and the frames last
+    written on it are kept until it is checked out again. APNS only
+    writes to a push socket to report an error before closing, so an
+    idle socket that has become readable is dropped on checkout, after
+    reporting the error and replaying the frames the gateway dropped.
+
+    Frame identifiers come from next_identifier, so they are unique
+    across every send sharing the pool's sockets.
+    """
+    def __init__(self, max_idle=None, connect=_apns_create_socket):
+        self.max_idle = max_idle
+        self.connect = connect
+        self._idle = defaultdict(list)
+        self._written = {}
+        self._identifiers = itertools.count()
+        self._lock = threading.Lock()
+
+    def next_identifier(self):
+        with self._lock:
+            # Identifiers are 4 bytes in the frame
+            return next(self._identifiers) % 2 ** 32
+
+    def _key(self, certfile):
+        return (_apns_get_certfile(certfile),
+                (SETTINGS["APNS_HOST"], SETTINGS["APNS_PORT"]))
+
+    def acquire(self, certfile=None):
+        """
+        Returns (key, sock, replay), where replay holds the frames that
+        earlier sends wrote on idle sockets after one the gateway
+        rejected. They were dropped and have to be written again.
+        """
+        key = self._key(certfile)
+        replay = []
+        while True:
+            with self._lock:
+                if not self._idle[key]:
+                    break
+                sock = self._idle[key].pop()
+            if self._is_healthy(sock):
+                return key, sock, replay
+            error = _apns_read_error(sock)
+            written = self.discard(sock)
+            if error is not None:
+                _apns_report_error(error, written)
+                replay.extend(_apns_frames_after(error.identifier, written))
+        return key, self.connect(key[1], key[0]), replay
+
+    def release(self, key, sock, frames=()):
+        max_idle = self.max_idle
+        if max_idle is None:
+            max_idle = SETTINGS["APNS_MAX_IDLE_CONNECTIONS"]
+        with self._lock:
+            if len(self._idle[key]) < max_idle:
+                self._idle[key].append(sock)
+                self._written[sock] = list(frames)
+                return
+        self.discard(sock)
+
+    def discard(self, sock):
+        """
+        Closes sock and returns the frames last released with it.
+        """
+        with self._lock:
+            written = self._written.pop(sock, [])
+        try:
+            sock.close()
+        except (socket.error, ssl.SSLError):
+            pass
+        return written
+
+    def close_all(self):
+        with self._lock:
+            sockets = [sock for idle in self._idle.values() for sock in idle]
+            self._idle.clear()
+        for sock in sockets:
+            self.discard(sock)
+
+    def _is_healthy(self, sock):
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (socket.error, ValueError):
+            return False
+        return not readable
+
+
+connection_pool = APNSConnectionPool()
+
+
 def _apns_create_socket_to_push(certfile=None):
     return _apns_create_socket(
         (SETTINGS["APNS_HOST"], SETTINGS["APNS_PORT"]), certfile)
@@ -147,11 +259,106 @@ def _apns_check_errors(sock):
         sock.settimeout(saved_timeout)
 
 
-def _apns_send(
+def _apns_read_error(sock):
+    """
+    Reads the error frame the gateway sends before closing a connection.
+    Returns an APNSServerError, or None if there is nothing to read.
+    """
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        data = sock.recv(6) if readable else None
+    except (socket.error, ssl.SSLError):
+        return None
+    if data and len(data) == 6:
+        command, status, identifier = struct.unpack("!BBI", data)
+        if command == 8 and status != 0:
+            return APNSServerError(status, identifier)
+    return None
+
+
+def _apns_frames_after(identifier, frames):
+    identifiers = [frame[0] for frame in frames]
+    if identifier not in identifiers:
+        return []
+    return frames[identifiers.index(identifier) + 1:]
+
+
+def _apns_report_error(error, frames):
+    """
+    Logs an error reported for one of frames after its send returned,
+    deactivating the device if the gateway found its token invalid.
+    """
+    tokens = dict((identifier, token) for identifier, token, _ in frames)
+    token = tokens.get(error.identifier)
+    logger.warning("APNS rejected notification %s to %s: %s",
+                   error.identifier, token,
+                   APNS_ERROR_MESSAGES.get(error.status, error.status))
+    if error.status == 8 and token is not None:
+        from .models import APNSDevice
+        APNSDevice.objects.filter(registration_id=token).update(active=False)
+
+
+def _apns_send_frames(frames, certfile=None, pool=None):
+    """
+    Writes (identifier, token, frame) triples over a pooled connection.
+
+    When the gateway rejects a frame it reports the identifier and closes
+    the connection, dropping every frame written after it. Those frames
+    are replayed over a fresh connection, and the first error for one of
+    the given frames is raised once every frame has been handed to the
+    gateway. Errors for frames of earlier sends on the same connection
+    are reported with _apns_report_error instead, and their dropped
+    frames are replayed as well.
+    """
+    pool = pool or connection_pool
+    own = set(frame[0] for frame in frames)
+    first_error = None
+    reconnected = False
+
+    while frames:
+        key, sock, replay = pool.acquire(certfile)
+        frames = replay + frames
+        written = 0
+        try:
+            for identifier, token, frame in frames:
+                sock.write(frame)
+                written += 1
+            _apns_check_errors(sock)
+        except APNSServerError as e:
+            error = e
+        except (socket.error, ssl.SSLError) as e:
+            error = _apns_read_error(sock)
+            if error is None:
+                pool.discard(sock)
+                # The connection went away without telling us why. Retry
+                # the unwritten frames once before giving up.
+                if reconnected:
+                    raise e
+                reconnected = True
+                frames = frames[written:]
+                continue
+        else:
+            pool.release(key, sock, frames)
+            break
+
+        sent = pool.discard(sock) + frames
+        if error.identifier in own:
+            first_error = first_error or error
+        else:
+            _apns_report_error(error, sent)
+        if error.identifier in [frame[0] for frame in sent]:
+            frames = _apns_frames_after(error.identifier, sent)
+        # Otherwise the rejected frame is older than what is kept, and
+        # every frame of this send was dropped after it.
+
+    if first_error is not None:
+        raise first_error
+
+
+def _apns_build_payload(
     token, alert, badge=None, sound=None, category=None,
     content_available=False, action_loc_key=None, loc_key=None, loc_args=[],
-    extra={}, identifier=0, expiration=None, priority=10, socket=None,
-    certfile=None, mutable_content=False, thread_id=None
+    extra={}, mutable_content=False, thread_id=None
 ):
     data = {}
     aps_data = {}
@@ -201,18 +408,28 @@ def _apns_send(
         raise APNSDataOverflow(
             "Notification body cannot exceed %i bytes" % (max_size))
 
+    return json_data
+
+
+def _apns_build_frame(token, alert, identifier=0, expiration=None,
+                      priority=10, **kwargs):
+    json_data = _apns_build_payload(token, alert, **kwargs)
+
     # if expiration isn't specified use 1 month from now
     expiration_time = expiration if expiration is not None else int(time.time()) + 2592000
 
-    frame = _apns_pack_frame(
+    return _apns_pack_frame(
         token, json_data, identifier, expiration_time, priority)
 
+
+def _apns_send(token, alert, socket=None, certfile=None, **kwargs):
     if socket:
-        socket.write(frame)
+        socket.write(_apns_build_frame(token, alert, **kwargs))
     else:
-        with closing(_apns_create_socket_to_push(certfile)) as socket:
-            socket.write(frame)
-            _apns_check_errors(socket)
+        # Pooled connections are shared, so the pool numbers the frame
+        kwargs["identifier"] = connection_pool.next_identifier()
+        frame = _apns_build_frame(token, alert, **kwargs)
+        _apns_send_frames([(kwargs["identifier"], token, frame)], certfile)
 
     return token
 
@@ -226,34 +443,36 @@ def _apns_read_and_unpack(socket, data_format):
         return None
 
 
-def _apns_receive_feedback(socket):
-    expired_token_list = []
-
+def _apns_iter_feedback(sock):
+    """
+    Yields (timestamp, token) tuples from the feedback socket as they are
+    read, until the service closes the connection.
+    """
     # read a timestamp (4 bytes) and device token length (2 bytes)
     header_format = "!LH"
-    has_data = True
-    while has_data:
+    while True:
         try:
             # read the header tuple
-            header_data = _apns_read_and_unpack(socket, header_format)
-            if header_data is not None:
-                timestamp, token_length = header_data
-                # Unpack format for a single value of length bytes
-                token_format = "%ss" % token_length
-                device_token = _apns_read_and_unpack(socket, token_format)
-                if device_token is not None:
-                    # _apns_read_and_unpack returns a tuple, but
-                    # it's just one item, so get the first.
-                    expired_token_list.append((timestamp, device_token[0]))
-            else:
-                has_data = False
+            header_data = _apns_read_and_unpack(sock, header_format)
+            if header_data is None:
+                return
+            timestamp, token_length = header_data
+            # Unpack format for a single value of length bytes
+            token_format = "%ss" % token_length
+            device_token = _apns_read_and_unpack(sock, token_format)
+            if device_token is not None:
+                # _apns_read_and_unpack returns a tuple, but
+                # it's just one item, so get the first.
+                yield timestamp, device_token[0]
         except socket.timeout:  # py3, see http://bugs.python.org/issue10272
             pass
         except ssl.SSLError as e:  # py2
             if "timed out" not in e.message:
                 raise
 
-    return expired_token_list
+
+def _apns_receive_feedback(socket):
+    return list(_apns_iter_feedback(socket))
 
 
 def apns_send_message(registration_id, alert, **kwargs):
@@ -266,8 +485,15 @@ def apns_send_message(registration_id, alert, **kwargs):
     Note that if set alert should always be a string. If it is not set,
     it won't be included in the notification. You will need to pass None
     to this for silent notifications.
+
+    With APNS_PROTOCOL set to "http2" this returns a dict mapping the
+    registration_id to "Success" or the reason APNS gave for rejecting it.
     """
 
+    if SETTINGS["APNS_PROTOCOL"] == "http2":
+        from .apns_http2 import apns_http2_send_bulk_message
+        return apns_http2_send_bulk_message([registration_id], alert, **kwargs)
+
     return _apns_send(registration_id, alert, **kwargs)
 
 
@@ -279,14 +505,36 @@ def apns_send_bulk_message(registration_ids, alert, **kwargs):
     Note that if set alert should always be a string. If it is not set,
     it won't be included in the notification. You will need to pass None
     to this for silent notifications.
+
+    With APNS_PROTOCOL set to "http2" this returns a dict mapping each
+    registration_id to "Success" or the reason APNS gave for rejecting it.
+    """
+    if SETTINGS["APNS_PROTOCOL"] == "http2":
+        from .apns_http2 import apns_http2_send_bulk_message
+        return apns_http2_send_bulk_message(registration_ids, alert, **kwargs)
+
+    certfile = kwargs.pop("certfile", None)
+    kwargs.pop("identifier", None)
+    frames = []
+    for registration_id in registration_ids:
+        identifier = connection_pool.next_identifier()
+        frames.append((identifier, registration_id, _apns_build_frame(
+            registration_id, alert, identifier=identifier, **kwargs)))
+    _apns_send_frames(frames, certfile)
+    if registration_ids:
+        return registration_ids[-1]
+
+
+def apns_iter_inactive_ids(certfile=None):
     """
-    certfile = kwargs.get("certfile", None)
-    with closing(_apns_create_socket_to_push(certfile)) as socket:
-        for identifier, registration_id in enumerate(registration_ids):
-            res = _apns_send(registration_id, alert, identifier=identifier,
-                             socket=socket, **kwargs)
-        _apns_check_errors(socket)
-        return res
+    Yields the id's that the APNS feedback service reports as no longer
+    active since the last fetch, as they are received.
+    """
+    with closing(_apns_create_socket_to_feedback(certfile)) as socket:
+        # Maybe we should have a flag to return the timestamp?
+        # It doesn't seem that useful right now, though.
+        for ts, registration_id in _apns_iter_feedback(socket):
+            yield codecs.encode(registration_id, "hex_codec")
 
 
 def apns_fetch_inactive_ids(certfile=None):
@@ -294,10 +542,4 @@ def apns_fetch_inactive_ids(certfile=None):
     Queries the APNS server for id's that are no longer active since
     the last fetch
     """
-    with closing(_apns_create_socket_to_feedback(certfile)) as socket:
-        inactive_ids = []
-        # Maybe we should have a flag to return the timestamp?
-        # It doesn't seem that useful right now, though.
-        for ts, registration_id in _apns_receive_feedback(socket):
-            inactive_ids.append(codecs.encode(registration_id, "hex_codec"))
-        return inactive_ids
+    return list(apns_iter_inactive_ids(certfile))
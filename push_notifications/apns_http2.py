@@ -0,0 +1,205 @@
+"""
+Apple Push Notification Service over HTTP/2, authenticated with JWT
+provider tokens. Documentation is available on the iOS Developer Library:
+https://developer.apple.com/library/content/documentation/NetworkingInternet/Conceptual/RemoteNotificationsPG/CommunicatingwithAPNs.html
+
+Requires the hyper package for HTTP/2 and the cryptography package to
+sign provider tokens.
+"""
+
+import json
+import sys
+import threading
+import time
+
+import jwt
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import six
+
+from .apns import _apns_build_payload
+from .settings import PUSH_NOTIFICATIONS_SETTINGS as SETTINGS
+
+
+# APNS rejects provider tokens older than an hour
+TOKEN_LIFETIME = 50 * 60
+
+# Reasons after which a device token will never be delivered to again
+INACTIVE_REASONS = ("BadDeviceToken", "DeviceTokenNotForTopic", "Unregistered")
+
+
+class APNSProviderToken(object):
+    """
+    Signs the JWT sent in the authorization header and reuses it until it
+    is about to expire.
+    """
+    def __init__(self, key_path=None, key_id=None, team_id=None):
+        self.key_path = key_path or SETTINGS["APNS_AUTH_KEY_PATH"]
+        self.key_id = key_id or SETTINGS["APNS_AUTH_KEY_ID"]
+        self.team_id = team_id or SETTINGS["APNS_TEAM_ID"]
+        if not (self.key_path and self.key_id and self.team_id):
+            raise ImproperlyConfigured(
+                'You need to set PUSH_NOTIFICATIONS_SETTINGS["APNS_AUTH_KEY_PATH"], '
+                '["APNS_AUTH_KEY_ID"] and ["APNS_TEAM_ID"] to send messages '
+                'through APNS over HTTP/2.'
+            )
+        self._key = None
+        self._token = None
+        self._issued_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = int(time.time())
+        with self._lock:
+            if self._token is None or now - self._issued_at >= TOKEN_LIFETIME:
+                self._token = self._sign(now)
+                self._issued_at = now
+            return self._token
+
+    def expire(self):
+        with self._lock:
+            self._token = None
+
+    def _sign(self, issued_at):
+        if self._key is None:
+            try:
+                with open(self.key_path, "r") as f:
+                    self._key = f.read()
+            except Exception as e:
+                raise ImproperlyConfigured(
+                    "The APNS auth key file at %r is not readable: %s" % (self.key_path, e))
+
+        try:
+            token = jwt.encode(
+                {"iss": self.team_id, "iat": issued_at}, self._key,
+                algorithm="ES256", headers={"kid": self.key_id})
+        except NotImplementedError:
+            raise ImproperlyConfigured(
+                "Signing APNS provider tokens requires the cryptography package.")
+        return token.decode("ascii")
+
+
+def _apns_http2_connect():
+    try:
+        from hyper import HTTP20Connection
+    except ImportError:
+        raise ImproperlyConfigured(
+            "Sending messages through APNS over HTTP/2 requires the hyper package.")
+
+    return HTTP20Connection(SETTINGS["APNS_HTTP2_HOST"],
+                            SETTINGS["APNS_HTTP2_PORT"], secure=True)
+
+
+class APNSHTTP2Client(object):
+    """
+    Sends notifications over one long-lived HTTP/2 connection, keeping up
+    to APNS_HTTP2_MAX_CONCURRENT_STREAMS requests in flight before reading
+    their responses.
+    """
+    def __init__(self, connect=_apns_http2_connect, token=None, topic=None):
+        self.connect = connect
+        self._token = token
+        self._topic = topic
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def token(self):
+        if self._token is None:
+            self._token = APNSProviderToken()
+        return self._token
+
+    @property
+    def topic(self):
+        topic = self._topic or SETTINGS["APNS_TOPIC"]
+        if not topic:
+            raise ImproperlyConfigured(
+                'You need to set PUSH_NOTIFICATIONS_SETTINGS["APNS_TOPIC"] '
+                'to send messages through APNS over HTTP/2.'
+            )
+        return topic
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def send(self, notifications, expiration=None, priority=10):
+        """
+        Sends (registration_id, payload) pairs and returns a dict mapping
+        each registration_id to "Success" or the reason APNS rejected it.
+        """
+        with self._lock:
+            try:
+                results = self._send(notifications, expiration, priority)
+                expired = [n for n in notifications
+                           if results[n[0]] == "ExpiredProviderToken"]
+                if expired:
+                    self.token.expire()
+                    results.update(self._send(expired, expiration, priority))
+            except Exception:
+                # The connection is in an unknown state; start over next time
+                exc_info = sys.exc_info()
+                self.close()
+                six.reraise(*exc_info)
+        return results
+
+    def _send(self, notifications, expiration, priority):
+        headers = {
+            "apns-priority": str(priority),
+            "apns-topic": self.topic,
+            "authorization": "bearer %s" % self.token.get(),
+        }
+        if expiration is not None:
+            headers["apns-expiration"] = str(expiration)
+
+        if self._connection is None:
+            self._connection = self.connect()
+        connection = self._connection
+
+        results = {}
+        max_streams = SETTINGS["APNS_HTTP2_MAX_CONCURRENT_STREAMS"]
+        for start in range(0, len(notifications), max_streams):
+            streams = [
+                (registration_id, connection.request(
+                    "POST", "/3/device/%s" % registration_id, body=payload,
+                    headers=headers))
+                for registration_id, payload in
+                notifications[start:start + max_streams]
+            ]
+            for registration_id, stream_id in streams:
+                response = connection.get_response(stream_id)
+                body = response.read()
+                if response.status == 200:
+                    results[registration_id] = "Success"
+                    continue
+                try:
+                    reason = json.loads(body.decode("utf-8"))["reason"]
+                except (ValueError, KeyError):
+                    reason = "HTTP %d" % response.status
+                results[registration_id] = reason
+        return results
+
+
+client = APNSHTTP2Client()
+
+
+def apns_http2_send_bulk_message(registration_ids, alert, expiration=None,
+                                 priority=10, certfile=None, identifier=None,
+                                 socket=None, **kwargs):
+    """
+    Sends an APNS notification to one or more registration_ids over HTTP/2.
+    Returns a dict mapping each registration_id to "Success" or the reason
+    APNS gave for rejecting it.
+
+    certfile, identifier and socket only apply to the binary protocol and
+    are accepted so callers work with either APNS_PROTOCOL.
+    """
+    notifications = [
+        (registration_id, _apns_build_payload(registration_id, alert, **kwargs))
+        for registration_id in registration_ids
+    ]
+    return client.send(notifications, expiration=expiration,
+                       priority=priority)
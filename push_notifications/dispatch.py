@@ -0,0 +1,48 @@
+"""
+Sends a notification to users on every platform they have devices on.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+from . import NotificationError
+from .models import APNSDevice, GCMDevice, WNSDevice
+
+
+PLATFORMS = ("apns", "gcm", "wns")
+
+
+def send_to_users(user_ids, message, sound=None, extra=None, badge=None,
+                  platforms=PLATFORMS):
+    """
+    Sends message to the active APNS, GCM/FCM and WNS devices of the given
+    users. Runs one query per device table, however many users or devices
+    there are, and hands each platform's devices to its bulk sender.
+
+    badge, if given, is called with a user id to get the APNS badge for
+    that user's devices. platforms limits the send to some of "apns",
+    "gcm" and "wns", e.g. to retry the ones that failed.
+
+    Returns two dicts: one mapping each platform that was sent to the
+    result of its bulk send, and one mapping each platform that failed
+    to its error. A failing platform doesn't stop the others.
+    """
+    user_ids = list(user_ids)
+    extra = extra or {}
+    sends = (
+        ("apns", APNSDevice, {"sound": sound, "extra": extra,
+                              "user_badge": badge}),
+        ("gcm", GCMDevice, {"extra": dict(extra)}),
+        ("wns", WNSDevice, {}),
+    )
+
+    results = {}
+    errors = {}
+    for platform, model, kwargs in sends:
+        if platform not in platforms:
+            continue
+        devices = model.objects.filter(user_id__in=user_ids)
+        try:
+            results[platform] = devices.send_message(message, **kwargs)
+        except (NotificationError, ImproperlyConfigured, IOError) as e:
+            errors[platform] = e
+    return results, errors
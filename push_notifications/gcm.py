@@ -6,18 +6,25 @@ https://developer.android.com/google/gcm/index.html
 """
 
 import json
+import socket
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
 from .models import GCMDevice
 
 
 try:
-    from urllib.request import Request, urlopen
-    from urllib.parse import urlencode
+    from http.client import HTTPConnection, HTTPException, HTTPSConnection
+    from urllib.parse import urlencode, urlparse
 except ImportError:
     # Python 2 support
-    from urllib2 import Request, urlopen
+    from httplib import HTTPConnection, HTTPException, HTTPSConnection
     from urllib import urlencode
+    from urlparse import urlparse
 
 from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
+from django.utils import six
 from . import NotificationError
 from .settings import PUSH_NOTIFICATIONS_SETTINGS as SETTINGS
 
@@ -34,6 +41,60 @@ def _chunks(l, n):
         yield l[i:i + n]
 
 
+# Keep-alive connections of the current thread, keyed by scheme and host
+_connections = threading.local()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """
+    Returns the process-wide thread pool used to send chunks in parallel.
+    Its threads live as long as the process so their keep-alive
+    connections are reused across bulk sends.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPool(SETTINGS["CM_MAX_CONCURRENT_REQUESTS"])
+        return _pool
+
+
+def _cm_post(url, data, headers, timeout):
+    """
+    POSTs data over a keep-alive connection owned by the current thread.
+    A connection the server closed while idle is replaced once.
+    """
+    parts = urlparse(url)
+    key = (parts.scheme, parts.netloc)
+    connections = _connections.__dict__.setdefault("connections", {})
+    path = parts.path + ("?" + parts.query if parts.query else "")
+
+    while True:
+        connection = connections.get(key)
+        fresh = connection is None
+        if fresh:
+            connection_class = HTTPSConnection if parts.scheme == "https" else HTTPConnection
+            connection = connection_class(parts.netloc, timeout=timeout)
+            connections[key] = connection
+        try:
+            connection.request("POST", path, data, headers)
+            response = connection.getresponse()
+            body = response.read()
+        except (HTTPException, socket.error):
+            connection.close()
+            del connections[key]
+            if fresh:
+                raise
+            continue
+        break
+
+    if response.status >= 400:
+        raise GCMError("HTTP Error %d: %s" % (response.status, response.reason))
+    return body
+
+
 def _gcm_send(data, content_type):
     key = SETTINGS.get("GCM_API_KEY")
     if not key:
@@ -46,8 +107,8 @@ def _gcm_send(data, content_type):
         "Authorization": "key=%s" % (key),
         "Content-Length": str(len(data)),
     }
-    request = Request(SETTINGS["GCM_POST_URL"], data, headers)
-    return urlopen(request, timeout=SETTINGS["GCM_ERROR_TIMEOUT"]).read().decode("utf-8")
+    return _cm_post(SETTINGS["GCM_POST_URL"], data, headers,
+                    SETTINGS["GCM_ERROR_TIMEOUT"]).decode("utf-8")
 
 
 def _fcm_send(data, content_type):
@@ -62,8 +123,8 @@ def _fcm_send(data, content_type):
         "Authorization": "key=%s" % (key),
         "Content-Length": str(len(data)),
     }
-    request = Request(SETTINGS["FCM_POST_URL"], data, headers)
-    return urlopen(request, timeout=SETTINGS["FCM_ERROR_TIMEOUT"]).read().decode("utf-8")
+    return _cm_post(SETTINGS["FCM_POST_URL"], data, headers,
+                    SETTINGS["FCM_ERROR_TIMEOUT"]).decode("utf-8")
 
 
 def _cm_send_plain(registration_id, data, cloud_type="GCM", **kwargs):
@@ -152,12 +213,7 @@ def _handler_cm_message_json(registration_ids, response_data, cloud_type):
             if new_id:
                 old_new_ids.append((registration_ids[index], new_id))
 
-        if ids_to_remove:
-            removed = GCMDevice.objects.filter(registration_id__in=ids_to_remove, cloud_message_type=cloud_type)
-            removed.update(active=0)
-
-        for old_id, new_id in old_new_ids:
-            _gcm_handle_canonical_id(new_id, old_id, cloud_type)
+        _gcm_reconcile_devices(ids_to_remove, old_new_ids, cloud_type)
 
         if throw_error:
             raise GCMError(response)
@@ -170,6 +226,15 @@ def _cm_send_json(registration_ids, data, cloud_type="GCM", **kwargs):
     needs to be a list.
     This will send the notification as json data.
     """
+    response = _cm_post_json(registration_ids, data, cloud_type, **kwargs)
+    return _handler_cm_message_json(registration_ids, response, cloud_type)
+
+
+def _cm_post_json(registration_ids, data, cloud_type="GCM", **kwargs):
+    """
+    Sends the json request for _cm_send_json and returns the decoded
+    response without acting on it.
+    """
 
     values = {"registration_ids": registration_ids} if registration_ids else {}
 
@@ -188,18 +253,89 @@ def _cm_send_json(registration_ids, data, cloud_type="GCM", **kwargs):
         response = json.loads(_fcm_send(data, "application/json"))
     else:
         raise ImproperlyConfigured("cloud_type must be GCM or FCM not %s" % str(cloud_type))
-    return _handler_cm_message_json(registration_ids, response, cloud_type)
+    return response
+
+
+def _cm_send_json_chunks(chunks, data, cloud_type, **kwargs):
+    """
+    Sends the chunks in parallel and handles their merged response once.
+
+    Chunks that succeeded are handled even if another chunk failed; the
+    first failure is raised afterwards.
+    """
+    def send_chunk(chunk):
+        try:
+            return _cm_post_json(chunk, data, cloud_type, **kwargs), None
+        except Exception:
+            return None, sys.exc_info()
+
+    registration_ids = []
+    merged = {"multicast_ids": [], "success": 0, "failure": 0,
+              "canonical_ids": 0, "results": []}
+    first_error = None
+    for chunk, (response, exc_info) in zip(chunks, _get_pool().map(send_chunk, chunks)):
+        if exc_info is not None:
+            first_error = first_error or exc_info
+            continue
+        registration_ids.extend(chunk)
+        merged["multicast_ids"].append(response.get("multicast_id"))
+        for key in ("success", "failure", "canonical_ids"):
+            merged[key] += response.get(key, 0)
+        merged["results"].extend(response.get("results", []))
+
+    if registration_ids:
+        _handler_cm_message_json(registration_ids, merged, cloud_type)
+    if first_error is not None:
+        six.reraise(*first_error)
+    return merged
 
 
 def _gcm_handle_canonical_id(canonical_id, current_id, cloud_type):
     """
     Handle situation when GCM server response contains canonical ID
     """
-    if GCMDevice.objects.filter(registration_id=canonical_id, cloud_message_type=cloud_type, active=True).exists():
-        GCMDevice.objects.filter(registration_id=current_id, cloud_message_type=cloud_type).update(active=False)
-    else:
-        GCMDevice.objects.filter(registration_id=current_id, cloud_message_type=cloud_type)\
-            .update(registration_id=canonical_id)
+    _gcm_reconcile_devices([], [(current_id, canonical_id)], cloud_type)
+
+
+def _gcm_reconcile_devices(ids_to_remove, old_new_ids, cloud_type):
+    """
+    Applies the device changes from one GCM response in a transaction:
+    deactivates ids_to_remove, and for each (old, canonical) pair either
+    rewrites the old id or, when the canonical id is already registered
+    (or claimed earlier in the same response), deactivates the old id.
+
+    Runs one query to find the registered canonical ids and at most two
+    UPDATEs, however many ids the response contains.
+    """
+    if not ids_to_remove and not old_new_ids:
+        return
+
+    devices = GCMDevice.objects.filter(cloud_message_type=cloud_type)
+    with transaction.atomic():
+        deactivate = set(ids_to_remove)
+        rewrites = {}
+        if old_new_ids:
+            claimed = set(devices.filter(
+                registration_id__in=set(new_id for old_id, new_id in old_new_ids),
+                active=True
+            ).values_list("registration_id", flat=True))
+            for old_id, new_id in old_new_ids:
+                if new_id in claimed:
+                    deactivate.add(old_id)
+                else:
+                    rewrites[old_id] = new_id
+                    claimed.add(new_id)
+
+        if deactivate:
+            devices.filter(registration_id__in=deactivate).update(active=False)
+        if rewrites:
+            devices.filter(registration_id__in=rewrites).update(
+                registration_id=models.Case(
+                    *[models.When(registration_id=old_id, then=models.Value(new_id))
+                      for old_id, new_id in rewrites.items()],
+                    output_field=models.TextField()
+                )
+            )
 
 
 def send_message(registration_id, data, cloud_type, **kwargs):
@@ -223,6 +359,10 @@ def send_bulk_message(registration_ids, data, cloud_type, **kwargs):
     needs to be a list.
     This will send the notification as json data.
 
+    Lists longer than GCM_MAX_RECIPIENTS / FCM_MAX_RECIPIENTS are split into
+    chunks sent in parallel over CM_MAX_CONCURRENT_REQUESTS threads, and
+    the chunk responses are merged into a single response.
+
     A reference of extra keyword arguments sent to the server is available here:
     https://firebase.google.com/docs/cloud-messaging/send-message
     """
@@ -239,9 +379,7 @@ def send_bulk_message(registration_ids, data, cloud_type, **kwargs):
     # https://developer.android.com/google/gcm/gcm.html#request
     if registration_ids:
         if len(registration_ids) > max_recipients:
-            ret = []
-            for chunk in _chunks(registration_ids, max_recipients):
-                ret.append(_cm_send_json(chunk, data, cloud_type=cloud_type, **kwargs))
-            return ret
+            chunks = list(_chunks(registration_ids, max_recipients))
+            return _cm_send_json_chunks(chunks, data, cloud_type, **kwargs)
 
     return _cm_send_json(registration_ids, data, cloud_type=cloud_type, **kwargs)
@@ -6,11 +6,6 @@ class Command(BaseCommand):
 	help = 'Deactivate APNS devices that are not receiving notifications'
 
 	def handle(self, *args, **options):
-		from push_notifications.models import APNSDevice, get_expired_tokens
-		expired = get_expired_tokens()
-		devices = APNSDevice.objects.filter(registration_id__in=expired)
-		for d in devices:
-			self.stdout.write('deactivating [%s]' % d.registration_id)
-			d.active = False
-			d.save()
-		self.stdout.write('deactivated %d devices' % len(devices))
+		from push_notifications.models import prune_expired_tokens
+		count = prune_expired_tokens()
+		self.stdout.write('deactivated %d devices' % count)
@@ -1,4 +1,6 @@
 from __future__ import unicode_literals
+from itertools import islice
+
 from django.db import models
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
@@ -44,7 +46,14 @@ class GCMDeviceManager(models.Manager):
 
 class GCMDeviceQuerySet(models.query.QuerySet):
     def send_message(self, message, **kwargs):
-        if self:
+        # A single query covers both cloud types
+        reg_ids = {"GCM": [], "FCM": []}
+        for registration_id, cloud_type in self.filter(active=True).values_list(
+            "registration_id", "cloud_message_type"
+        ):
+            reg_ids.setdefault(cloud_type, []).append(registration_id)
+
+        if any(reg_ids.values()):
             from .gcm import send_bulk_message
 
             data = kwargs.pop("extra", {})
@@ -53,14 +62,9 @@ class GCMDeviceQuerySet(models.query.QuerySet):
 
             response = []
             for cloud_type in ("GCM", "FCM"):
-                reg_ids = list(
-                    self.filter(active=True, cloud_message_type=cloud_type).values_list(
-                        "registration_id", flat=True
-                    )
-                )
-                if reg_ids:
+                if reg_ids[cloud_type]:
                     r = send_bulk_message(
-                        registration_ids=reg_ids, data=data,
+                        registration_ids=reg_ids[cloud_type], data=data,
                         cloud_type=cloud_type, **kwargs
                     )
                     response.append(r)
@@ -106,13 +110,27 @@ class APNSDeviceManager(models.Manager):
 
 
 class APNSDeviceQuerySet(models.query.QuerySet):
-    def send_message(self, message, **kwargs):
-        if self:
+    def send_message(self, message, user_badge=None, **kwargs):
+        """
+        Sends message to the active devices. user_badge, if given, is
+        called with each device's user id to get the badge for that device.
+        """
+        users = dict(self.filter(active=True).values_list(
+            "registration_id", "user_id"))
+        if users:
             from .apns import apns_send_bulk_message
-            reg_ids = list(self.filter(active=True).values_list(
-                "registration_id", flat=True))
-            return apns_send_bulk_message(registration_ids=reg_ids,
-                                          alert=message, **kwargs)
+            if user_badge is not None:
+                kwargs["badge"] = lambda token: user_badge(users[token])
+            results = apns_send_bulk_message(registration_ids=list(users),
+                                             alert=message, **kwargs)
+            if isinstance(results, dict):
+                from .apns_http2 import INACTIVE_REASONS
+                inactive = [registration_id for registration_id, reason
+                            in results.items() if reason in INACTIVE_REASONS]
+                if inactive:
+                    self.model.objects.filter(
+                        registration_id__in=inactive).update(active=False)
+            return results
 
 
 class APNSDevice(Device):
@@ -143,11 +161,11 @@ class WNSDeviceManager(models.Manager):
 
 class WNSDeviceQuerySet(models.query.QuerySet):
     def send_message(self, message, **kwargs):
-        if self:
+        reg_ids = list(self.filter(active=True).values_list(
+            "registration_id", flat=True))
+        if reg_ids:
             from .wns import wns_send_bulk_message
 
-            reg_ids = list(self.filter(active=True).values_list(
-                "registration_id", flat=True))
             return wns_send_bulk_message(uri_list=reg_ids, message=message,
                                          **kwargs)
 
@@ -176,3 +194,30 @@ class WNSDevice(Device):
 def get_expired_tokens(cerfile=None):
     from .apns import apns_fetch_inactive_ids
     return apns_fetch_inactive_ids(cerfile)
+
+
+def prune_expired_tokens(queryset=None, tokens=None, certfile=None,
+                         chunk_size=None):
+    """
+    Deactivates the devices in queryset (all APNS devices by default) whose
+    token is in tokens, which defaults to the tokens streamed from the APNS
+    feedback service. Tokens are handled chunk_size at a time, one UPDATE
+    per chunk, so the feedback list is never held in memory.
+
+    Returns the number of devices deactivated.
+    """
+    if queryset is None:
+        queryset = APNSDevice.objects.all()
+    if tokens is None:
+        from .apns import apns_iter_inactive_ids
+        tokens = apns_iter_inactive_ids(certfile)
+    chunk_size = chunk_size or SETTINGS["APNS_PRUNE_CHUNK_SIZE"]
+
+    tokens = iter(tokens)
+    count = 0
+    while True:
+        chunk = list(islice(tokens, chunk_size))
+        if not chunk:
+            return count
+        count += queryset.filter(registration_id__in=chunk, active=True) \
+            .update(active=False)
@@ -12,11 +12,16 @@ PUSH_NOTIFICATIONS_SETTINGS.setdefault("FCM_POST_URL", "https://fcm.googleapis.c
 PUSH_NOTIFICATIONS_SETTINGS.setdefault("FCM_MAX_RECIPIENTS", 1000)
 PUSH_NOTIFICATIONS_SETTINGS.setdefault("FCM_ERROR_TIMEOUT", None)
 
+# Chunks of a GCM or FCM bulk message sent at the same time
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("CM_MAX_CONCURRENT_REQUESTS", 4)
+
 # APNS
 PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_PORT", 2195)
 PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_FEEDBACK_PORT", 2196)
 PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_ERROR_TIMEOUT", None)
 PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_MAX_NOTIFICATION_SIZE", 2048)
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_MAX_IDLE_CONNECTIONS", 4)
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_PRUNE_CHUNK_SIZE", 1000)
 if settings.DEBUG:
     PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_HOST", "gateway.sandbox.push.apple.com")
     PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_FEEDBACK_HOST", "feedback.sandbox.push.apple.com")
@@ -24,10 +29,29 @@ else:
     PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_HOST", "gateway.push.apple.com")
     PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_FEEDBACK_HOST", "feedback.push.apple.com")
 
+# APNS over HTTP/2 with token based authentication, used when APNS_PROTOCOL
+# is "http2" instead of the legacy "binary" interface
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_PROTOCOL", "binary")
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_AUTH_KEY_PATH", None)
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_AUTH_KEY_ID", None)
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_TEAM_ID", None)
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_TOPIC", None)
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_HTTP2_PORT", 443)
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_HTTP2_MAX_CONCURRENT_STREAMS", 500)
+if settings.DEBUG:
+    PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_HTTP2_HOST", "api.development.push.apple.com")
+else:
+    PUSH_NOTIFICATIONS_SETTINGS.setdefault("APNS_HTTP2_HOST", "api.push.apple.com")
+
 # WNS
 PUSH_NOTIFICATIONS_SETTINGS.setdefault("WNS_PACKAGE_SECURITY_ID", None)
 PUSH_NOTIFICATIONS_SETTINGS.setdefault("WNS_SECRET_KEY", None)
 PUSH_NOTIFICATIONS_SETTINGS.setdefault("WNS_ACCESS_URL", "https://login.live.com/accesstoken.srf")
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("WNS_TOKEN_CACHE", "default")
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("WNS_TOKEN_EXPIRY_MARGIN", 300)
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("WNS_MAX_CONCURRENT_REQUESTS", 8)
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("WNS_THROTTLE_RETRIES", 3)
+PUSH_NOTIFICATIONS_SETTINGS.setdefault("WNS_THROTTLE_BACKOFF", 1.0)
 
 # User model
 PUSH_NOTIFICATIONS_SETTINGS.setdefault("USER_MODEL", settings.AUTH_USER_MODEL)
@@ -6,7 +6,10 @@ https://msdn.microsoft.com/en-us/windows/uwp/controls-and-patterns/tiles-and-not
 """
 
 import json
+import threading
+import time
 import xml.etree.ElementTree as ET
+from multiprocessing.pool import ThreadPool
 
 try:
     from urllib.error import HTTPError
@@ -17,8 +20,11 @@ except ImportError:
     from urllib2 import HTTPError, Request, urlopen
     from urllib import urlencode
 
+from django.core.cache import caches
 from django.core.exceptions import ImproperlyConfigured
+from django.utils import six
 from . import NotificationError
+from .models import WNSDevice
 from .settings import PUSH_NOTIFICATIONS_SETTINGS as SETTINGS
 
 
@@ -31,14 +37,25 @@ class WNSAuthenticationError(WNSError):
 
 
 class WNSNotificationResponseError(WNSError):
-    pass
+    def __init__(self, message, status=None):
+        super(WNSNotificationResponseError, self).__init__(message)
+        self.status = status
 
 
 def _wns_authenticate(scope="notify.windows.com"):
     """
     Requests an Access token for WNS communication.
 
-    :return: dict: {'access_token': <str>, 'expires_in': <int>, 'token_type': 'bearer'}
+    :return: str: The access token
+    """
+    return _wns_request_token(scope)[0]
+
+
+def _wns_request_token(scope="notify.windows.com"):
+    """
+    Requests an Access token for WNS communication.
+
+    :return: tuple: (access_token, expires_in)
     """
     client_id = SETTINGS["WNS_PACKAGE_SECURITY_ID"]
     if not client_id:
@@ -85,7 +102,39 @@ def _wns_authenticate(scope="notify.windows.com"):
         # Upstream WNS issue
         raise WNSAuthenticationError("Access token missing from WNS response.")
 
-    return access_token
+    return access_token, int(oauth_data.get("expires_in", 0))
+
+
+# Access tokens of this process by scope, as (access_token, expires_at)
+_access_tokens = {}
+_access_tokens_lock = threading.Lock()
+
+
+def _wns_access_token(scope="notify.windows.com", rejected=None):
+    """
+    Returns a cached access token, requesting a new one when the cached
+    token is about to expire or is the `rejected` token WNS just refused.
+
+    Tokens are shared between processes through the cache named by
+    WNS_TOKEN_CACHE, so a token refreshed by one worker is picked up by
+    the others instead of each one authenticating again.
+    """
+    cache = caches[SETTINGS["WNS_TOKEN_CACHE"]]
+    cache_key = "push_notifications:wns_token:%s" % scope
+
+    with _access_tokens_lock:
+        now = time.time()
+        for cached in (_access_tokens.get(scope), cache.get(cache_key)):
+            if cached and cached[1] > now and cached[0] != rejected:
+                _access_tokens[scope] = cached
+                return cached[0]
+
+        access_token, expires_in = _wns_request_token(scope)
+        lifetime = max(expires_in - SETTINGS["WNS_TOKEN_EXPIRY_MARGIN"], 0)
+        _access_tokens[scope] = (access_token, now + lifetime)
+        if lifetime:
+            cache.set(cache_key, _access_tokens[scope], lifetime)
+        return access_token
 
 
 def _wns_send(uri, data, wns_type="wns/toast"):
@@ -96,12 +145,29 @@ def _wns_send(uri, data, wns_type="wns/toast"):
     :param data: dict: The notification data to be sent.
     :return:
     """
-    access_token = _wns_authenticate()
-
     content_type = "text/xml"
     if wns_type == "wns/raw":
         content_type = "application/octet-stream"
 
+    if type(data) is str:
+        data = data.encode("utf-8")
+
+    access_token = _wns_access_token()
+    try:
+        return _wns_post(uri, data, content_type, wns_type, access_token)
+    except HTTPError as err:
+        if err.code != 401:
+            raise _wns_response_error(err)
+
+    # The token was revoked or expired early; get a new one and retry once
+    access_token = _wns_access_token(rejected=access_token)
+    try:
+        return _wns_post(uri, data, content_type, wns_type, access_token)
+    except HTTPError as err:
+        raise _wns_response_error(err)
+
+
+def _wns_post(uri, data, content_type, wns_type, access_token):
     headers = {
         # content_type is "text/xml" (toast/badge/tile) | "application/octet-stream" (raw)
         "Content-Type": content_type,
@@ -109,40 +175,68 @@ def _wns_send(uri, data, wns_type="wns/toast"):
         "X-WNS-Type": wns_type,  # wns/toast | wns/badge | wns/tile | wns/raw
     }
 
-    if type(data) is str:
-        data = data.encode("utf-8")
-
     request = Request(uri, data, headers)
+    return urlopen(request).read().decode("utf-8")
+
 
+def _wns_response_error(err):
+    """
+    Returns the WNSNotificationResponseError describing an HTTPError
+    from WNS, or the HTTPError itself for unexpected status codes.
+    """
     # A lot of things can happen, let them know which one.
-    try:
-        response = urlopen(request)
-    except HTTPError as err:
-        if err.code == 400:
-            msg = "One or more headers were specified incorrectly or conflict with another header."
-        elif err.code == 401:
-            msg = "The cloud service did not present a valid authentication ticket."
-        elif err.code == 403:
-            msg = "The cloud service is not authorized to send a notification to this URI."
-        elif err.code == 404:
-            msg = "The channel URI is not valid or is not recognized by WNS."
-        elif err.code == 405:
-            msg = "Invalid method. Only POST or DELETE is allowed."
-        elif err.code == 406:
-            msg = "The cloud service exceeded its throttle limit"
-        elif err.code == 410:
-            msg = "The channel expired."
-        elif err.code == 413:
-            msg = "The notification payload exceeds the 500 byte limit."
-        elif err.code == 500:
-            msg = "An internal failure caused notification delivery to fail."
-        elif err.code == 503:
-            msg = "The server is currently unavailable."
-        else:
-            raise err
-        raise WNSNotificationResponseError("HTTP %i: %s" % (err.code, msg))
+    if err.code == 400:
+        msg = "One or more headers were specified incorrectly or conflict with another header."
+    elif err.code == 401:
+        msg = "The cloud service did not present a valid authentication ticket."
+    elif err.code == 403:
+        msg = "The cloud service is not authorized to send a notification to this URI."
+    elif err.code == 404:
+        msg = "The channel URI is not valid or is not recognized by WNS."
+    elif err.code == 405:
+        msg = "Invalid method. Only POST or DELETE is allowed."
+    elif err.code == 406:
+        msg = "The cloud service exceeded its throttle limit"
+    elif err.code == 410:
+        msg = "The channel expired."
+    elif err.code == 413:
+        msg = "The notification payload exceeds the 500 byte limit."
+    elif err.code == 500:
+        msg = "An internal failure caused notification delivery to fail."
+    elif err.code == 503:
+        msg = "The server is currently unavailable."
+    else:
+        return err
+    return WNSNotificationResponseError("HTTP %i: %s" % (err.code, msg),
+                                        status=err.code)
 
-    return response.read().decode("utf-8")
+
+def _wns_send_with_backoff(uri, data, wns_type):
+    """
+    Sends like _wns_send, waiting and retrying up to WNS_THROTTLE_RETRIES
+    times when WNS answers 406 (throttled). The wait starts at
+    WNS_THROTTLE_BACKOFF seconds and doubles after each attempt.
+    """
+    retries = SETTINGS["WNS_THROTTLE_RETRIES"]
+    for attempt in range(retries + 1):
+        try:
+            return _wns_send(uri=uri, data=data, wns_type=wns_type)
+        except WNSNotificationResponseError as err:
+            if err.status != 406 or attempt == retries:
+                raise
+        time.sleep(SETTINGS["WNS_THROTTLE_BACKOFF"] * 2 ** attempt)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPool(SETTINGS["WNS_MAX_CONCURRENT_REQUESTS"])
+        return _pool
 
 
 def _wns_prepare_toast(data, **kwargs):
@@ -210,10 +304,21 @@ def wns_send_message(uri, message=None, xml_data=None, raw_data=None, **kwargs):
     :param xml_data: dict: A dictionary containing data to be converted to an xml tree.
     :param raw_data: str: Data to be sent via a `raw` notification.
     """
+    wns_type, prepared_data = _wns_prepare_message(
+        message, xml_data, raw_data, **kwargs)
+    _wns_send(uri=uri, data=prepared_data, wns_type=wns_type)
+
+
+def _wns_prepare_message(message=None, xml_data=None, raw_data=None, **kwargs):
+    """
+    Builds the notification body for wns_send_message.
+
+    :return: tuple: (wns_type, prepared_data)
+    """
     # Create a simple toast notification
     if message:
         wns_type = "wns/toast"
-        if isinstance(message, str):
+        if isinstance(message, six.string_types):
             message = {
                 "text": [message, ],
             }
@@ -233,24 +338,51 @@ def wns_send_message(uri, message=None, xml_data=None, raw_data=None, **kwargs):
             "`message`, `xml_data`, `raw_data`"
         )
 
-    _wns_send(uri=uri, data=prepared_data, wns_type=wns_type)
+    return wns_type, prepared_data
 
 
 def wns_send_bulk_message(uri_list, message=None, xml_data=None, raw_data=None, **kwargs):
     """
-    WNS doesn't support bulk notification, so we loop through each uri.
+    WNS doesn't support bulk notification, so we send to each uri, using up
+    to WNS_MAX_CONCURRENT_REQUESTS requests at a time.
+
+    A failure for one uri doesn't stop the others. Throttled sends (406)
+    are retried with backoff, and devices whose channel is unknown (404)
+    or expired (410) are deactivated with a single update.
 
     :param uri_list: list: A list of uris the notification will be sent to.
     :param message: str: The notification data to be sent.
     :param xml_data: dict: A dictionary containing data to be converted to an xml tree.
     :param raw_data: str: Data to be sent via a `raw` notification.
+    :return: dict: Maps each uri to "Success" or the error it failed with.
     """
-    if uri_list:
-        for uri in uri_list:
-            wns_send_message(
-                uri=uri, message=message, xml_data=xml_data,
-                raw_data=raw_data, **kwargs
-            )
+    if not uri_list:
+        return {}
+
+    wns_type, prepared_data = _wns_prepare_message(
+        message, xml_data, raw_data, **kwargs)
+
+    def send(uri):
+        try:
+            _wns_send_with_backoff(uri, prepared_data, wns_type)
+        except (WNSNotificationResponseError, IOError) as err:
+            return uri, err
+        return uri, None
+
+    results = {}
+    expired = []
+    for uri, err in _get_pool().map(send, uri_list):
+        if err is None:
+            results[uri] = "Success"
+            continue
+        results[uri] = str(err)
+        if getattr(err, "status", None) in (404, 410):
+            expired.append(uri)
+
+    if expired:
+        WNSDevice.objects.filter(registration_id__in=expired).update(active=False)
+
+    return results
 
 
 def dict_to_xml_schema(data):